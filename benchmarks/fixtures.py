@@ -0,0 +1,248 @@
+"""
+Fixtures served by the stand-in server
+
+Recorded responses are loaded from a directory when available (one json file per endpoint, see FILES),
+the missing ones are generated with a fixed seed (the schedules are relative to the current time)
+"""
+
+import json
+import os
+import random
+from datetime import datetime, timedelta, timezone
+
+FILES = {
+    "lines": "lines.json",
+    "relations": "relations.json",
+    "exchange_areas": "exchange_areas.json",
+    "stop_and_lines": "stop_and_lines.json",
+    "stop_monitoring": "stop_monitoring.json",
+    "general_message": "general_message.json",
+    "line_reports": "line_reports.json",
+}
+
+MODES = ["bus", "bus", "bus", "bus", "rail", "metro", "tram"]
+CITIES = ["Paris", "Saint-Denis", "Versailles", "Nanterre", "Créteil", "Évry"]
+STATUSES = ["onTime", "onTime", "onTime", "delayed", "early", "cancelled", ""]
+
+
+def load(directory=None, lines=1500, stops_per_line=25, visits=200, seed=42):
+    """
+    Returns the fixtures (a map of the FILES keys to the json payloads)
+
+    Args:
+        directory: the directory containing the recorded responses, everything is generated if None
+        lines: the number of generated lines
+        stops_per_line: the number of generated stops per line
+        visits: the number of generated visits in the stop monitoring response
+        seed: the random seed
+    """
+    rnd = random.Random(seed)
+    ret = {}
+    ret.update(reference_data(rnd, lines, stops_per_line))
+    ret["stop_monitoring"] = stop_monitoring(rnd, visits)
+    ret["general_message"] = general_message(rnd, 10)
+    ret["line_reports"] = line_reports(rnd, 10)
+
+    if directory is not None:
+        for key, name in FILES.items():
+            path = os.path.join(directory, name)
+            if os.path.exists(path):
+                with open(path, "r", encoding="utf-8") as f:
+                    ret[key] = json.load(f)
+    return ret
+
+
+def reference_data(rnd: random.Random, lines: int, stops_per_line: int) -> dict:
+    n_stops = max(lines * stops_per_line // 3, stops_per_line)
+    n_areas = max(n_stops // 2, 1)
+
+    line_rows = []
+    for i in range(lines):
+        fields = {
+            "id_line": f"C{i:05d}",
+            "name_line": str(i),
+            "transportmode": MODES[i % len(MODES)],
+        }
+        if fields["transportmode"] == "bus":
+            fields["operatorname"] = f"Operator {i % 12}"
+        line_rows.append({"fields": fields})
+
+    relations = []
+    for i in range(n_stops):
+        relations.append(
+            {
+                "fields": {
+                    "arrid": str(100000 + i),
+                    "zdaid": str(200000 + i),
+                    "zdcid": str(300000 + i % n_areas),
+                }
+            }
+        )
+
+    areas = [{"zdcid": str(300000 + i), "zdcname": f"Area {i}"} for i in range(n_areas)]
+
+    stop_and_lines = []
+    for i in range(lines):
+        for s in rnd.sample(range(n_stops), stops_per_line):
+            if MODES[i % len(MODES)] == "rail":
+                stop_id = f"IDFM:monomodalStopPlace:{200000 + s}"
+            else:
+                stop_id = f"IDFM:{100000 + s}"
+            stop_and_lines.append(
+                {
+                    "fields": {
+                        "id": f"IDFM:C{i:05d}",
+                        "stop_id": stop_id,
+                        "stop_name": f"Stop {s}",
+                        "nom_commune": CITIES[s % len(CITIES)],
+                        "code_insee": str(75000 + s % 100),
+                        "stop_lat": str(48.6 + rnd.random() * 0.5),
+                        "stop_lon": str(2.0 + rnd.random() * 0.7),
+                    }
+                }
+            )
+
+    return {
+        "lines": line_rows,
+        "relations": relations,
+        "exchange_areas": areas,
+        "stop_and_lines": stop_and_lines,
+    }
+
+
+def stop_monitoring(rnd: random.Random, visits: int) -> dict:
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    rows = []
+    for i in range(visits):
+        line = f"C{rnd.randrange(20):05d}"
+        dest = f"Destination {rnd.randrange(8)}"
+        aimed = now + timedelta(seconds=30 * i)
+        expected = aimed + timedelta(seconds=rnd.choice([0, 0, 0, 60, 120, 300]))
+        status = rnd.choice(STATUSES)
+        rows.append(
+            {
+                "RecordedAtTime": _siri_time(now),
+                "ItemIdentifier": f"RATP:{i}",
+                "MonitoringRef": {"value": "STIF:StopPoint:Q:41087:"},
+                "MonitoredVehicleJourney": {
+                    "LineRef": {"value": f"STIF:Line::{line}:"},
+                    "OperatorRef": {"value": "SNCF_ACCES_CLOUD:Operator::SNCF:"},
+                    "FramedVehicleJourneyRef": {
+                        "DataFrameRef": {"value": "any"},
+                        "DatedVehicleJourneyRef": f"SNCF:{line}:{i}",
+                    },
+                    "DirectionName": [{"value": dest}] if i % 4 else [],
+                    "DestinationRef": {"value": f"STIF:StopPoint:Q:{400000 + i % 8}:"},
+                    "DestinationName": [{"value": dest}],
+                    "JourneyNote": [{"value": f"N{i % 10}"}] if i % 3 else [],
+                    "MonitoredCall": {
+                        "StopPointName": [{"value": "Gare"}],
+                        "VehicleAtStop": i == 0,
+                        "DestinationDisplay": [{"value": dest}],
+                        "AimedArrivalTime": _siri_time(aimed),
+                        "ExpectedArrivalTime": _siri_time(expected),
+                        "ArrivalPlatformName": {"value": str(i % 4)},
+                        "ArrivalStatus": status,
+                        "AimedDepartureTime": _siri_time(aimed),
+                        "ExpectedDepartureTime": _siri_time(expected),
+                        "DepartureStatus": status,
+                    },
+                },
+            }
+        )
+    return {
+        "Siri": {
+            "ServiceDelivery": {
+                "ResponseTimestamp": _siri_time(now),
+                "StopMonitoringDelivery": [
+                    {
+                        "ResponseTimestamp": _siri_time(now),
+                        "Version": "2.0",
+                        "Status": "true",
+                        "MonitoredStopVisit": rows,
+                    }
+                ],
+            }
+        }
+    }
+
+
+def general_message(rnd: random.Random, messages: int) -> dict:
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    rows = []
+    for i in range(messages):
+        rows.append(
+            {
+                "RecordedAtTime": _siri_time(now - timedelta(days=i)),
+                "ItemIdentifier": f"message-{i}",
+                "InfoMessageIdentifier": {"value": f"IDFM:{i}"},
+                "InfoMessageVersion": 1 + i % 3,
+                "InfoChannelRef": {"value": "Perturbation"},
+                "ValidUntilTime": _siri_time(now + timedelta(days=1 + i)),
+                "Content": {
+                    "Message": [
+                        {
+                            "MessageType": "SHORT_MESSAGE",
+                            "MessageText": {"value": f"Travaux {i}"},
+                        },
+                        {
+                            "MessageType": "TEXT_ONLY",
+                            "MessageText": {"value": f"Trafic perturbé {i}"},
+                        },
+                    ]
+                },
+            }
+        )
+    return {
+        "Siri": {
+            "ServiceDelivery": {
+                "GeneralMessageDelivery": [{"Status": "true", "InfoMessage": rows}]
+            }
+        }
+    }
+
+
+def line_reports(rnd: random.Random, disruptions: int) -> dict:
+    now = datetime.now().replace(microsecond=0)
+    rows = []
+    for i in range(disruptions):
+        rows.append(
+            {
+                "id": f"disruption-{i}",
+                "disruption_id": f"disruption-{i}",
+                "impact_id": f"impact-{i}",
+                "updated_at": _navitia_time(now - timedelta(hours=i)),
+                "status": "active",
+                "category": "Incidents",
+                "cause": "perturbation",
+                "tags": ["Ascenseur"] if i % 5 == 0 else ["Actualité"],
+                "severity": {
+                    "name": "perturbation",
+                    "effect": "SIGNIFICANT_DELAYS",
+                    "priority": 10 + i,
+                },
+                "messages": [
+                    {"channel": {"name": "titre"}, "text": f"Incident {i}"},
+                    {
+                        "channel": {"name": "moteur"},
+                        "text": f'<p>Trafic perturbé entre <strong>A</strong> et <a href="https://example.org">B</a> &amp; C ({i}).</p>',
+                    },
+                ],
+                "application_periods": [
+                    {
+                        "begin": _navitia_time(now - timedelta(days=1)),
+                        "end": _navitia_time(now + timedelta(days=j + 1)),
+                    }
+                    for j in range(3)
+                ],
+            }
+        )
+    return {"disruptions": rows}
+
+
+def _siri_time(d: datetime) -> str:
+    return d.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+def _navitia_time(d: datetime) -> str:
+    return d.strftime("%Y%m%dT%H%M%S")
@@ -0,0 +1,197 @@
+"""
+Offline benchmarks, run from the root of the repository with:
+
+    python -m benchmarks.run [--fixtures DIR] [--save-baseline]
+
+The results are compared to the stored baseline (benchmarks/baseline.json), the exit code is 1 if a metric regressed
+by more than the tolerance. The baseline depends on the machine (its "environment" entry records the one it was
+produced on), regenerate it with --save-baseline before comparing changes on another one.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+import aiohttp
+
+from benchmarks import fixtures
+from benchmarks.server import StandInServer
+from idfm_api import IDFMApi
+from idfm_api.dataset import Dataset
+from idfm_api.models import TrafficData
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+# True if a higher value is better
+METRICS = {
+    "dataset_build_seconds": False,
+    "dataset_peak_mib": False,
+    "decode_visits_per_second": True,
+    "get_traffic_p50_ms": False,
+    "get_traffic_p99_ms": False,
+}
+
+
+async def bench_dataset(server: StandInServer, session, repeat: int) -> dict:
+    times = []
+    with server.patch_dataset():
+        for _ in range(repeat):
+            Dataset.lines = None
+            start = time.perf_counter()
+            await Dataset.fetch_data(session)
+            times.append(time.perf_counter() - start)
+
+        tracemalloc.start()
+        await Dataset.fetch_data(session)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return {
+        "dataset_build_seconds": min(times),
+        "dataset_peak_mib": peak / (1024 * 1024),
+    }
+
+
+def bench_decode(data: dict, rounds: int, duration: float = 1) -> dict:
+    """
+    The throughput is the best of the rounds, the slower ones are disturbed by the other processes
+    """
+    visits = data["Siri"]["ServiceDelivery"]["StopMonitoringDelivery"][0][
+        "MonitoredStopVisit"
+    ]
+    best = 0
+    for _ in range(rounds):
+        count = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < duration:
+            for i in visits:
+                TrafficData.from_json(i)
+            count += len(visits)
+        best = max(best, count / (time.perf_counter() - start))
+    return {"decode_visits_per_second": best}
+
+
+async def bench_get_traffic(
+    server: StandInServer, session, calls: int, rounds: int, warmup: int
+) -> dict:
+    """
+    The percentiles are the medians over the rounds, the warm-up calls (connection setup) are not measured
+    """
+    api = IDFMApi(session, "benchmark", base_url=server.prim_url)
+    for _ in range(warmup):
+        await api.get_traffic("STIF:StopPoint:Q:41087:")
+
+    p50 = []
+    p99 = []
+    for _ in range(rounds):
+        latencies = []
+        for _ in range(calls):
+            start = time.perf_counter()
+            await api.get_traffic("STIF:StopPoint:Q:41087:")
+            latencies.append((time.perf_counter() - start) * 1000)
+        latencies.sort()
+        p50.append(statistics.median(latencies))
+        p99.append(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))])
+    return {
+        "get_traffic_p50_ms": statistics.median(p50),
+        "get_traffic_p99_ms": statistics.median(p99),
+    }
+
+
+def environment() -> dict:
+    """
+    Describes the machine running the benchmarks
+    """
+    return {
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpus": os.cpu_count(),
+        "python": f"{platform.python_implementation()} {platform.python_version()}",
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    Returns the names of the metrics that regressed by more than the tolerance
+    """
+    ret = []
+    for name, higher_is_better in METRICS.items():
+        if name not in baseline or name not in results or baseline[name] == 0:
+            continue
+        ratio = results[name] / baseline[name]
+        if (higher_is_better and ratio < 1 - tolerance) or (
+            not higher_is_better and ratio > 1 + tolerance
+        ):
+            ret.append(name)
+    return ret
+
+
+async def main(args) -> int:
+    data = fixtures.load(args.fixtures, lines=args.lines)
+    server = StandInServer(data)
+    await server.start()
+    try:
+        async with aiohttp.ClientSession() as session:
+            results = {}
+            results.update(await bench_dataset(server, session, args.repeat))
+            results.update(bench_decode(data["stop_monitoring"], args.rounds))
+            results.update(
+                await bench_get_traffic(
+                    server, session, args.calls, args.rounds, args.warmup
+                )
+            )
+    finally:
+        await server.stop()
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+
+    if "environment" in baseline:
+        env = baseline["environment"]
+        print(f"baseline recorded on {env.get('platform')} ({env.get('python')})")
+    for name, value in results.items():
+        ref = baseline.get(name)
+        diff = f"{(value / ref - 1) * 100:+.1f}%" if ref else "n/a"
+        print(f"{name:<28} {value:>14.3f}   baseline {ref or 0:>14.3f}   {diff}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({"environment": environment(), **results}, f, indent=2)
+            f.write("\n")
+        print(f"baseline saved to {args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"regressions (> {args.tolerance:.0%}): {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline idfm_api benchmarks")
+    parser.add_argument("--fixtures", help="directory containing recorded responses")
+    parser.add_argument("--baseline", default=BASELINE, help="baseline json file")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--lines", type=int, default=1500, help="generated lines")
+    parser.add_argument("--repeat", type=int, default=3, help="dataset builds")
+    parser.add_argument(
+        "--calls", type=int, default=500, help="get_traffic calls per round"
+    )
+    parser.add_argument(
+        "--rounds", type=int, default=3, help="decode and get_traffic rounds"
+    )
+    parser.add_argument(
+        "--warmup", type=int, default=20, help="unmeasured get_traffic calls"
+    )
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,218 @@
+"""
+Local aiohttp stand-in for the PRIM, navitia and open data endpoints
+
+It can also be started on its own, for example to test another client:
+
+    python -m benchmarks.server --port 8080 --latency 0.05 --error-rate 0.01
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from aiohttp import web
+
+from benchmarks import fixtures as fixtures_module
+from idfm_api import dataset
+from idfm_api.dataset import Dataset
+
+DATASET_URLS = {
+    "LINES": "lines",
+    "STOP_RELATIONS": "relations",
+    "EXCHANGE_AREAS": "exchange_areas",
+    "STOP_AND_LINES": "stop_and_lines",
+}
+
+CACHE_ATTRIBUTES = ("lines", "line_index", "stops", "stop_table", "graph")
+
+
+class StandInServer:
+    """
+    Serves the fixtures on the same paths as the real endpoints (the payloads are serialized only once)
+
+    The PRIM/navitia endpoints can simulate a degraded upstream: a latency (with an optional uniform jitter),
+    a ratio of HTTP 500 errors and a request quota per window, answered with HTTP 429 once exhausted
+
+    Usage:
+        server = StandInServer(fixtures.load())
+        await server.start()
+        api = IDFMApi(session, "key", base_url=server.prim_url)
+        with server.patch_dataset():
+            ...
+        await server.stop()
+    """
+
+    def __init__(
+        self,
+        fixtures: dict,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0,
+        jitter: float = 0,
+        error_rate: float = 0,
+        quota: Optional[int] = None,
+        quota_window: float = 60,
+        seed: int = 42,
+    ):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.quota = quota
+        self.quota_window = quota_window
+        self.requests: dict[str, int] = {}
+        self.errors = 0
+        self.rejected = 0
+        self._random = random.Random(seed)
+        self._window_start = time.monotonic()
+        self._window_requests = 0
+        self._payloads = {k: json.dumps(v).encode() for k, v in fixtures.items()}
+        self._runner = None
+
+        self.app = web.Application()
+        self.app.router.add_get(
+            "/marketplace/stop-monitoring", self._handler("stop_monitoring", True)
+        )
+        self.app.router.add_get(
+            "/marketplace/general-message", self._handler("general_message", True)
+        )
+        self.app.router.add_get(
+            "/marketplace/v2/navitia/{path:.*}", self._handler("line_reports", True)
+        )
+        for name in DATASET_URLS.values():
+            self.app.router.add_get(f"/opendata/{name}", self._handler(name))
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def prim_url(self) -> str:
+        """
+        The url to use as IDFMApi base_url
+        """
+        return f"{self.url}/marketplace"
+
+    async def start(self):
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    @contextmanager
+    def patch_dataset(self):
+        """
+        Points the Dataset to the stand-in server and clears its cache (both are restored on exit)
+        """
+        saved = {k: getattr(dataset, k) for k in DATASET_URLS}
+        cache = {k: getattr(Dataset, k) for k in CACHE_ATTRIBUTES}
+        for k, name in DATASET_URLS.items():
+            setattr(dataset, k, f"{self.url}/opendata/{name}")
+        for k in CACHE_ATTRIBUTES:
+            setattr(Dataset, k, None)
+        try:
+            yield
+        finally:
+            for k, v in saved.items():
+                setattr(dataset, k, v)
+            for k, v in cache.items():
+                setattr(Dataset, k, v)
+
+    def _handler(self, name: str, upstream: bool = False):
+        async def handler(request: web.Request) -> web.Response:
+            self.requests[name] = self.requests.get(name, 0) + 1
+            if upstream:
+                fault = await self._fault()
+                if fault is not None:
+                    return fault
+            return web.Response(
+                body=self._payloads[name], content_type="application/json"
+            )
+
+        return handler
+
+    async def _fault(self) -> Optional[web.Response]:
+        if self.quota is not None:
+            now = time.monotonic()
+            if now - self._window_start >= self.quota_window:
+                self._window_start = now
+                self._window_requests = 0
+            self._window_requests += 1
+            if self._window_requests > self.quota:
+                self.rejected += 1
+                return web.json_response(
+                    {
+                        "message": f"Rate limit exceeded ! You reach the limit of {self.quota} requests per {self.quota_window:g} seconds",
+                        "http_status_code": 429,
+                    },
+                    status=429,
+                )
+
+        delay = self.latency
+        if self.jitter:
+            delay += self._random.uniform(0, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        if self.error_rate and self._random.random() < self.error_rate:
+            self.errors += 1
+            return web.json_response(
+                {"message": "Internal Server Error", "http_status_code": 500},
+                status=500,
+            )
+        return None
+
+
+async def serve(args):
+    server = StandInServer(
+        fixtures_module.load(args.fixtures, lines=args.lines, visits=args.visits),
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        quota=args.quota,
+        quota_window=args.quota_window,
+    )
+    await server.start()
+    print(f"PRIM stand-in listening on {server.prim_url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """
+    Adds the stand-in server options to a command line parser
+    """
+    parser.add_argument("--fixtures", help="directory containing recorded responses")
+    parser.add_argument("--lines", type=int, default=1500, help="generated lines")
+    parser.add_argument("--visits", type=int, default=200, help="visits per stop")
+    parser.add_argument("--latency", type=float, default=0, help="seconds")
+    parser.add_argument("--jitter", type=float, default=0, help="seconds")
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--quota", type=int, help="requests per quota window")
+    parser.add_argument("--quota-window", type=float, default=60, help="seconds")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="PRIM stand-in server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    add_arguments(parser)
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
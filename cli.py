@@ -1,5 +1,7 @@
 from idfm_api import IDFMApi
+from idfm_api.gateway import Gateway
 from idfm_api.models import TransportType
+import argparse
 import asyncio
 import aiohttp
 
@@ -44,5 +46,25 @@ async def main():
 
     await session.close()
 
+async def serve(args):
+    apikey = args.apikey or input("Enter API KEY:")
+    async with IDFMApi(None, apikey) as idfm:
+        gateway = Gateway(idfm, poll_interval=args.poll_interval, idle_timeout=args.idle_timeout)
+        await gateway.start(args.host, args.port)
+        print(f"Gateway listening on http://{args.host}:{args.port} (endpoints: /traffic, /directions, /destinations, /status)")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await gateway.stop()
+
+parser = argparse.ArgumentParser(description="IDFM API interactive demo")
+parser.add_argument("--serve", action="store_true", help="run the caching HTTP gateway instead of the interactive demo")
+parser.add_argument("--apikey", help="PRIM API key (asked if omitted)")
+parser.add_argument("--host", default="127.0.0.1")
+parser.add_argument("--port", type=int, default=8080)
+parser.add_argument("--poll-interval", type=float, default=30, help="seconds between two upstream requests for a stop")
+parser.add_argument("--idle-timeout", type=float, default=300, help="seconds after which a stop which is no longer requested is not polled anymore")
+args = parser.parse_args()
+
 loop = asyncio.get_event_loop()
-loop.run_until_complete(main())
+loop.run_until_complete(serve(args) if args.serve else main())
@@ -1,53 +1,140 @@
 import asyncio
 import logging
-from typing import List, Optional
+import time
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional
 
 import aiohttp
 import async_timeout
 
 from idfm_api.dataset import Dataset
+from idfm_api.metrics import NO_HOOKS, MetricsHook
+from idfm_api import models
 from idfm_api.models import (
     InfoData,
     LineData,
     ReportData,
     StopData,
+    StopSnapshot,
     TrafficData,
+    TrafficFilter,
+    TransportStatus,
     TransportType,
 )
+from idfm_api.transport import (
+    ManagedTransport,
+    PoolStats,
+    TransportConfig,
+    accept_encoding,
+)
+from idfm_api.utils import normalize_stop_id
 
+PRIM_URL = "https://prim.iledefrance-mobilites.fr/marketplace"
 TIMEOUT = 60
+SNAPSHOT_TTL = 30
 _LOGGER: logging.Logger = logging.getLogger(__package__)
 
 
 class IDFMApi:
     def __init__(
-        self, session: aiohttp.ClientSession, apikey: str, timeout: int = TIMEOUT
+        self,
+        session: Optional[aiohttp.ClientSession],
+        apikey: str,
+        timeout: int = TIMEOUT,
+        snapshot_ttl: float = SNAPSHOT_TTL,
+        transport: Optional[TransportConfig] = None,
+        hooks: Optional[MetricsHook] = None,
+        base_url: str = PRIM_URL,
     ) -> None:
+        """
+        Args:
+            session: the aiohttp session to use, if None a session with a tuned connection pool is created and owned by this instance (managed mode)
+            apikey: the PRIM API key
+            timeout: the requests timeout in seconds
+            snapshot_ttl: how long (in seconds) the stop snapshots are reused
+            transport: the connection pool settings for the managed mode (defaults to TransportConfig())
+            hooks: the instrumentation callbacks (see MetricsRecorder), disabled if None
+            base_url: the PRIM marketplace url (can be changed to use a proxy or a stand-in server)
+        Raises:
+            ValueError: if both a session and a transport configuration are specified
+        """
+        if session is not None and transport is not None:
+            raise ValueError("transport can only be specified in managed mode")
         self._session = session
+        self._transport = None
+        if session is None:
+            self._transport = ManagedTransport(transport or TransportConfig())
+        compression = self._transport is None or self._transport.config.compression
+        self._headers = {
+            "apiKey": apikey,
+            "Content-Type": "application/json",
+            "Accept-encoding": accept_encoding() if compression else "identity",
+        }
         self._apikey = apikey
+        self._base_url = base_url
+        self._hooks = NO_HOOKS if hooks is None else hooks
         self._timeout = timeout
+        self._snapshot_ttl = snapshot_ttl
+        self._snapshots = {}
+        self._pending_snapshots = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def close(self):
+        """
+        Closes the session in managed mode (the caller provided session is never closed)
+        """
+        if self._transport is not None:
+            await self._transport.close()
 
-    async def __request(self, url):
+    def pool_stats(self) -> Optional[PoolStats]:
+        """
+        Returns the connection pool statistics
+
+        Returns:
+            A PoolStats object, None if the session is provided by the caller
+        """
+        if self._transport is None:
+            return None
+        return self._transport.stats()
+
+    @property
+    def __session(self) -> aiohttp.ClientSession:
+        if self._transport is not None:
+            return self._transport.session
+        return self._session
+
+    async def __request(self, url, endpoint):
         """
         API request helper for PRIM
         Args:
             url: the url to request
+            endpoint: the endpoint name reported to the hooks
         Returns:
             A json object
         Raises:
             UnknownIdentifierException
         """
+        # only one error kind is reported per request
+        http_error = False
         try:
             async with async_timeout.timeout(self._timeout):
-                response = await self._session.get(
+                start = time.perf_counter()
+                response = await self.__session.get(
                     url,
-                    headers={
-                        "apiKey": self._apikey,
-                        "Content-Type": "application/json",
-                        "Accept-encoding": "gzip, deflate",
-                    },
+                    headers=self._headers,
+                )
+                body = await response.read()
+                self._hooks.on_request(
+                    endpoint, time.perf_counter() - start, len(body), response.status
                 )
                 if response.status != 200:
+                    http_error = True
+                    self._hooks.on_error(endpoint, "http")
                     try:
                         err = (await response.json())["Siri"]["ServiceDelivery"][
                             "StopMonitoringDelivery"
@@ -65,13 +152,17 @@ class IDFMApi:
                         url,
                         response._body,
                     )
+                start = time.perf_counter()
                 resp = (await response.json())["Siri"]["ServiceDelivery"]
+                self._hooks.on_decode(endpoint, "json", time.perf_counter() - start, 1)
                 if "GeneralMessageDelivery" in resp:
                     resp = resp["GeneralMessageDelivery"][0]
                 elif "StopMonitoringDelivery" in resp:
                     resp = resp["StopMonitoringDelivery"][0]
 
                 if resp["Status"] == "false":
+                    if not http_error:
+                        self._hooks.on_error(endpoint, "api")
                     _LOGGER.warn(
                         "Error while fetching information from %s - %s",
                         url,
@@ -81,18 +172,31 @@ class IDFMApi:
 
                 return resp
 
+        except aiohttp.ContentTypeError:
+            if not http_error:
+                self._hooks.on_error(endpoint, "decode")
+            raise
+        except aiohttp.ClientError:
+            self._hooks.on_error(endpoint, "connection")
+            raise
+        except (KeyError, IndexError, ValueError):
+            if not http_error:
+                self._hooks.on_error(endpoint, "decode")
+            raise
         except asyncio.TimeoutError as exception:
+            self._hooks.on_error(endpoint, "timeout")
             _LOGGER.error(
                 "Timeout error fetching information from %s - %s",
                 url,
                 exception,
             )
 
-    async def __navitia_request(self, url):
+    async def __navitia_request(self, url, endpoint):
         """
         API request helper for navitia
         Args:
             url: the url to request
+            endpoint: the endpoint name reported to the hooks
         Returns:
             A json object
         Raises:
@@ -100,15 +204,17 @@ class IDFMApi:
         """
         try:
             async with async_timeout.timeout(self._timeout):
-                response = await self._session.get(
+                start = time.perf_counter()
+                response = await self.__session.get(
                     url,
-                    headers={
-                        "apiKey": self._apikey,
-                        "Content-Type": "application/json",
-                        "Accept-encoding": "gzip, deflate",
-                    },
+                    headers=self._headers,
+                )
+                body = await response.read()
+                self._hooks.on_request(
+                    endpoint, time.perf_counter() - start, len(body), response.status
                 )
                 if response.status != 200:
+                    self._hooks.on_error(endpoint, "http")
                     _LOGGER.warn(
                         "Error while fetching information from %s - %s",
                         url,
@@ -116,9 +222,22 @@ class IDFMApi:
                     )
                     return None
 
-                return await response.json()
+                start = time.perf_counter()
+                resp = await response.json()
+                self._hooks.on_decode(endpoint, "json", time.perf_counter() - start, 1)
+                return resp
 
+        except aiohttp.ContentTypeError:
+            self._hooks.on_error(endpoint, "decode")
+            raise
+        except aiohttp.ClientError:
+            self._hooks.on_error(endpoint, "connection")
+            raise
+        except (KeyError, IndexError, ValueError):
+            self._hooks.on_error(endpoint, "decode")
+            raise
         except asyncio.TimeoutError as exception:
+            self._hooks.on_error(endpoint, "timeout")
             _LOGGER.error(
                 "Timeout error fetching information from %s - %s",
                 url,
@@ -126,6 +245,31 @@ class IDFMApi:
             )
             return None
 
+    async def __stop_monitoring(self, stop_id: str, line_id: Optional[str]):
+        """
+        Stop monitoring request helper
+        Args:
+            stop_id: the id of the stop area
+            line_id: the id of the line, ignored if None
+        Returns:
+            The list of raw MonitoredStopVisit json objects
+        """
+        # for backward compatibility where only the stoppoint id is specified
+        stop_id = normalize_stop_id(stop_id)
+
+        line = f"&LineRef=STIF:Line::{line_id}:" if line_id is not None else ""
+        request = f"{self._base_url}/stop-monitoring?MonitoringRef={stop_id}"
+        try:
+            response = await self.__request(request + line, "stop-monitoring")
+        except UnknownIdentifierException:
+            # if the MonitoringRef/LineRef couple does not exists, fallback to use only the MonitoringRef
+            _LOGGER.debug(
+                "unknown MonitoringRef/LineRef couple, falling back to only MonitoringRef"
+            )
+            response = await self.__request(request, "stop-monitoring")
+
+        return response["MonitoredStopVisit"]
+
     async def get_stops(self, line_id: str) -> List[StopData]:
         """
         Return a list of stop areas corresponding to the specified line
@@ -135,56 +279,176 @@ class IDFMApi:
             A list of StopData objects
         """
         ret = []
-        data = await Dataset.get_stops(self._session)
+        data = await Dataset.get_stops(self.__session, self._hooks)
         if line_id in data:
             for i in data[line_id]:
                 ret.append(StopData.from_json(i))
         return ret
 
+    async def get_reachable_stops(
+        self, stop_id: str, max_transfers: int = 0
+    ) -> List[StopData]:
+        """
+        Returns the stop areas reachable from the specified stop with a limited number of transfers
+
+        Args:
+            stop_id: A string indicating the id of the depart stop area or exchange area
+            max_transfers: the maximum number of line changes (0 means only the lines serving the depart stop)
+        Returns:
+            A list of StopData objects (including the depart stops)
+        """
+        graph = await Dataset.get_graph(self.__session, self._hooks)
+        ret = []
+        for i in graph.reachable(stop_id, max_transfers):
+            ret.append(StopData.from_table(graph.table, graph.index_of(i)))
+        return ret
+
+    async def get_connecting_lines(self, from_id: str, to_id: str) -> List[LineData]:
+        """
+        Returns the lines directly connecting two exchange areas
+
+        Args:
+            from_id: A string indicating the id of the first exchange area (or stop area)
+            to_id: A string indicating the id of the second exchange area (or stop area)
+        Returns:
+            A list of LineData objects, the lines with a transport mode which is not a TransportType are logged and skipped
+        """
+        graph = await Dataset.get_graph(self.__session, self._hooks)
+        lines = await Dataset.get_line_index(self.__session, self._hooks)
+        ret = []
+        for i in graph.lines_between(from_id, to_id):
+            if i not in lines:
+                continue
+            name, mode = lines[i]
+            try:
+                ret.append(LineData(name=name, id=i, type=TransportType(mode)))
+            except ValueError:
+                _LOGGER.info(
+                    "skipping line %s (%s), unsupported transport mode %s",
+                    i,
+                    name,
+                    mode,
+                )
+        return ret
+
     async def get_traffic(
         self,
         stop_id: str,
         destination_name: Optional[str] = None,
         direction_name: Optional[str] = None,
         line_id: Optional[str] = None,
+        after: Optional[datetime] = None,
+        before: Optional[datetime] = None,
+        statuses: Optional[Iterable[TransportStatus]] = None,
     ) -> List[TrafficData]:
         """
         Returns the next schedules in a line for a specified depart area to an optional destination
 
+        The filters are applied on the raw response, only the matching visits are decoded.
+        A new request is made on every call, use get_stop_snapshot to share one request with get_directions/get_destinations
+
         Args:
             stop_id: A string indicating the id of the depart stop area
             destination_name: A string indicating the final destination (I.E. the station name returned by get_directions), the schedules for all the available destinations are returned if not specified
             direction_name: A boolean indicating the direction of a train, ignored if not specified
             line_id: A string indicating id of a line (if not specified, all schedules for this stop/direction will be returned regardless of the line)
+            after: only return the schedules at or after this time (timezone aware), ignored if not specified
+            before: only return the schedules at or before this time (timezone aware), ignored if not specified
+            statuses: only return the schedules with one of these status, ignored if not specified
         Returns:
             A list of TrafficData objects
+        Raises:
+            ValueError: if after or before is a naive datetime
         """
 
-        # for backward compatibility where only the stoppoint id is specified
-        if stop_id[0:4] != "STIF":
-            stop_id = f"STIF:StopPoint:Q:{stop_id.split(':')[-1]}:"
+        filter = TrafficFilter(
+            line_id=line_id,
+            destination_name=destination_name,
+            direction_name=direction_name,
+            after=after,
+            before=before,
+            statuses=None if statuses is None else frozenset(statuses),
+        )
+        visits = await self.__stop_monitoring(stop_id, line_id)
+        start = time.perf_counter()
+        ret = []
+        for i in visits:
+            if filter.matches(i):
+                d = TrafficData.from_json(i)
+                if d:
+                    ret.append(d)
+        sort = time.perf_counter()
+        self._hooks.on_decode("stop-monitoring", "models", sort - start, len(ret))
+        ret.sort()
+        self._hooks.on_decode(
+            "stop-monitoring", "sort", time.perf_counter() - sort, len(ret)
+        )
+        return ret
 
-        line = f"&LineRef=STIF:Line::{line_id}:" if line_id is not None else ""
-        request = f"https://prim.iledefrance-mobilites.fr/marketplace/stop-monitoring?MonitoringRef={stop_id}"
-        try:
-            response = await self.__request(request + line)
-        except UnknownIdentifierException:
-            # if the MonitoringRef/LineRef couple does not exists, fallback to use only the MonitoringRef
-            _LOGGER.debug(
-                "unknown MonitoringRef/LineRef couple, falling back to only MonitoringRef"
-            )
-            response = await self.__request(request)
+    async def get_stop_snapshot(
+        self,
+        stop_id: str,
+        line_id: Optional[str] = None,
+        max_age: Optional[float] = None,
+    ) -> StopSnapshot:
+        """
+        Returns the next schedules of a stop area along with its available directions and destinations per line
+
+        A single request is made, the snapshot is then reused by get_directions/get_destinations (and returned by this function) until it is older than snapshot_ttl seconds.
+        Concurrent calls for the same stop and line share the request in progress.
 
+        Args:
+            stop_id: A string indicating the id of the depart stop area
+            line_id: A string indicating id of a line (if not specified, all schedules for this stop will be returned regardless of the line)
+            max_age: the maximum age in seconds of a reused snapshot, defaults to snapshot_ttl (0 always waits for a new request)
+        Returns:
+            A StopSnapshot object
+        """
+        # the short and full ids of a stop share the same snapshot
+        stop_id = normalize_stop_id(stop_id)
+        key = (stop_id, line_id)
+        cached = self._snapshots.get(key)
+        if max_age is None:
+            max_age = self._snapshot_ttl
+        if cached is not None and time.monotonic() - cached[0] < max_age:
+            self._hooks.on_cache("snapshots", 1, 0)
+            return cached[1]
+
+        pending = self._pending_snapshots.get(key)
+        if pending is None:
+            self._hooks.on_cache("snapshots", 0, 1)
+            pending = self._pending_snapshots[key] = asyncio.ensure_future(
+                self.__snapshot(stop_id, line_id)
+            )
+            pending.add_done_callback(lambda _: self._pending_snapshots.pop(key, None))
+        else:
+            self._hooks.on_cache("snapshots", 1, 0)
+        # a cancelled caller must not cancel the request shared with the others
+        return await asyncio.shield(pending)
+
+    async def __snapshot(self, stop_id: str, line_id: Optional[str]) -> StopSnapshot:
+        now = time.monotonic()
+        visits = await self.__stop_monitoring(stop_id, line_id)
+        start = time.perf_counter()
+        filter = TrafficFilter(line_id=line_id)
         ret = []
-        for i in response["MonitoredStopVisit"]:
-            d = TrafficData.from_json(i)
-            if (
-                d
-                and (direction_name is None or d.direction == direction_name)
-                and (destination_name is None or d.destination_name == destination_name)
-            ):
-                ret.append(d)
-        return sorted(ret)
+        for i in visits:
+            if filter.matches(i):
+                d = TrafficData.from_json(i)
+                if d:
+                    ret.append(d)
+        snapshot = StopSnapshot.from_traffic(
+            stop_id, line_id, ret, datetime.now(timezone.utc)
+        )
+        self._hooks.on_decode(
+            "stop-monitoring", "models", time.perf_counter() - start, len(ret)
+        )
+
+        self._snapshots = {
+            k: v for k, v in self._snapshots.items() if now - v[0] < self._snapshot_ttl
+        }
+        self._snapshots[(stop_id, line_id)] = (now, snapshot)
+        return snapshot
 
     async def get_destinations(
         self,
@@ -202,12 +466,8 @@ class IDFMApi:
         Returns:
             A list of string representing the stations names
         """
-        ret = set()
-        for i in await self.get_traffic(
-            stop_id, direction_name=direction_name, line_id=line_id
-        ):
-            ret.add(i.destination_name)
-        return list(ret)
+        snapshot = await self.get_stop_snapshot(stop_id, line_id)
+        return snapshot.get_destinations(direction_name=direction_name)
 
     async def get_directions(
         self, stop_id: str, line_id: Optional[str] = None
@@ -221,10 +481,8 @@ class IDFMApi:
         Returns:
             A list of string representing the stations names
         """
-        ret = set()
-        for i in await self.get_traffic(stop_id, line_id=line_id):
-            ret.add(i.direction)
-        return list(ret)
+        snapshot = await self.get_stop_snapshot(stop_id, line_id)
+        return snapshot.get_directions()
 
     async def get_infos(self, line_id: str) -> List[InfoData]:
         """
@@ -239,11 +497,22 @@ class IDFMApi:
         """
         ret = []
         data = await self.__request(
-            f"https://prim.iledefrance-mobilites.fr/marketplace/general-message?LineRef=STIF:Line::{line_id}:"
+            f"{self._base_url}/general-message?LineRef=STIF:Line::{line_id}:",
+            "general-message",
         )
         if data:
+            start = time.perf_counter()
+            hits, misses = models._INFO_CACHE.hits, models._INFO_CACHE.misses
             for i in data["InfoMessage"]:
                 ret.append(InfoData.from_json(i))
+            self._hooks.on_decode(
+                "general-message", "models", time.perf_counter() - start, len(ret)
+            )
+            self._hooks.on_cache(
+                "disruptions",
+                models._INFO_CACHE.hits - hits,
+                models._INFO_CACHE.misses - misses,
+            )
         return ret
 
     async def get_line_reports(
@@ -260,9 +529,12 @@ class IDFMApi:
         """
         ret = []
         data = await self.__navitia_request(
-            f"https://prim.iledefrance-mobilites.fr/marketplace/v2/navitia/lines%2Fline%3AIDFM%3A{line_id}/line_reports"
+            f"{self._base_url}/v2/navitia/lines%2Fline%3AIDFM%3A{line_id}/line_reports",
+            "line_reports",
         )
         if data:
+            start = time.perf_counter()
+            hits, misses = models._REPORT_CACHE.hits, models._REPORT_CACHE.misses
             for i in data["disruptions"]:
                 if (
                     not exclude_elevator
@@ -270,6 +542,14 @@ class IDFMApi:
                     or "Ascenseur" not in i["tags"]
                 ):
                     ret.append(ReportData.from_json(i))
+            self._hooks.on_decode(
+                "line_reports", "models", time.perf_counter() - start, len(ret)
+            )
+            self._hooks.on_cache(
+                "disruptions",
+                models._REPORT_CACHE.hits - hits,
+                models._REPORT_CACHE.misses - misses,
+            )
         return ret
 
     async def get_lines(
@@ -284,7 +564,7 @@ class IDFMApi:
             A list of LineData objects
         """
         ret = []
-        data = await Dataset.get_lines(self._session)
+        data = await Dataset.get_lines(self.__session, self._hooks)
         if transport.value in data:
             for name, id in data[transport.value].items():
                 ret.append(LineData(name=name, id=id, type=transport))
@@ -0,0 +1,258 @@
+import math
+import struct
+import sys
+from array import array
+from dataclasses import dataclass, field
+from typing import Optional
+
+MAGIC = b"IDFMSTB2"
+_HEADER = struct.Struct("<8sII")
+_LENGTH = struct.Struct("<I")
+
+
+@dataclass(frozen=True)
+class StopTable:
+    """
+    Columnar representation of the stops/lines reference data built by the Dataset
+
+    Every stop appears once, the stop columns are parallel arrays indexed by the stop position.
+    The stops served by a line are stored in a CSR layout: the stops of ``line_ids[i]`` are
+    ``line_stops[line_offsets[i]:line_offsets[i + 1]]`` (indexes in the stop columns, in the dataset order)
+    """
+
+    stop_id: list[str]
+    name: list[Optional[str]]
+    city: list[Optional[str]]
+    zip_code: list[Optional[str]]
+    exchange_area_id: list[Optional[str]]
+    exchange_area_name: list[Optional[str]]
+    lat: array
+    lon: array
+    line_ids: list[str]
+    line_offsets: array
+    line_stops: array
+    _line_index: dict[str, int] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(
+            self, "_line_index", {l: i for i, l in enumerate(self.line_ids)}
+        )
+
+    def __len__(self):
+        return len(self.stop_id)
+
+    @staticmethod
+    def from_stops(stops: dict[str, list[dict]]):
+        """
+        Build the table from the Dataset stops mapping
+
+        Args:
+            stops: a map of the line id to a list of stops (as returned by Dataset.get_stops)
+        Returns:
+            A StopTable object
+        """
+        index = {}
+        stop_id = []
+        name = []
+        city = []
+        zip_code = []
+        exchange_area_id = []
+        exchange_area_name = []
+        lat = array("d")
+        lon = array("d")
+        line_ids = []
+        line_offsets = array("I", [0])
+        line_stops = array("I")
+
+        for line_id, line in stops.items():
+            for s in line:
+                pos = index.get(s["stop_id"])
+                if pos is None:
+                    pos = len(stop_id)
+                    index[s["stop_id"]] = pos
+                    stop_id.append(s["stop_id"])
+                    name.append(s["name"])
+                    city.append(s["city"])
+                    zip_code.append(s["zipCode"])
+                    exchange_area_id.append(s["exchange_area_id"])
+                    exchange_area_name.append(s["exchange_area_name"])
+                    lat.append(_to_float(s["x"]))
+                    lon.append(_to_float(s["y"]))
+                line_stops.append(pos)
+            line_ids.append(line_id)
+            line_offsets.append(len(line_stops))
+
+        return StopTable(
+            stop_id=stop_id,
+            name=name,
+            city=city,
+            zip_code=zip_code,
+            exchange_area_id=exchange_area_id,
+            exchange_area_name=exchange_area_name,
+            lat=lat,
+            lon=lon,
+            line_ids=line_ids,
+            line_offsets=line_offsets,
+            line_stops=line_stops,
+        )
+
+    def stops_of(self, line_id: str) -> array:
+        """
+        Returns the stop indexes served by the specified line
+
+        Args:
+            line_id: A string indicating the id of a line
+        Returns:
+            An array of indexes in the stop columns, empty if the line is unknown
+        """
+        i = self._line_index.get(line_id)
+        if i is None:
+            return array("I")
+        return self.line_stops[self.line_offsets[i] : self.line_offsets[i + 1]]
+
+    def to_numpy(self) -> dict:
+        """
+        Converts the columns to NumPy arrays (requires numpy to be installed)
+
+        The string columns are converted to unicode arrays, missing values are empty strings
+
+        Returns:
+            A dict mapping the column name to its NumPy array
+        """
+        try:
+            import numpy as np
+        except ImportError as e:
+            raise ImportError("numpy is required to use StopTable.to_numpy") from e
+
+        return {
+            "stop_id": np.array(self.stop_id, dtype=str),
+            "name": np.array([i or "" for i in self.name], dtype=str),
+            "city": np.array([i or "" for i in self.city], dtype=str),
+            "zip_code": np.array([i or "" for i in self.zip_code], dtype=str),
+            "exchange_area_id": np.array(
+                [i or "" for i in self.exchange_area_id], dtype=str
+            ),
+            "exchange_area_name": np.array(
+                [i or "" for i in self.exchange_area_name], dtype=str
+            ),
+            "lat": np.frombuffer(self.lat, dtype=np.float64).copy(),
+            "lon": np.frombuffer(self.lon, dtype=np.float64).copy(),
+            "line_ids": np.array(self.line_ids, dtype=str),
+            "line_offsets": np.frombuffer(self.line_offsets, dtype=np.uint32).copy(),
+            "line_stops": np.frombuffer(self.line_stops, dtype=np.uint32).copy(),
+        }
+
+    def dump(self, path: str):
+        """
+        Writes the table to a compact binary file
+
+        Args:
+            path: the destination file path
+        """
+        with open(path, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, len(self.stop_id), len(self.line_ids)))
+            for col in (
+                self.stop_id,
+                self.name,
+                self.city,
+                self.zip_code,
+                self.exchange_area_id,
+                self.exchange_area_name,
+                self.line_ids,
+            ):
+                _write_strings(f, col)
+            for col in (self.lat, self.lon, self.line_offsets, self.line_stops):
+                _write_array(f, col)
+
+    @staticmethod
+    def load(path: str):
+        """
+        Reads a table previously written with dump
+
+        Args:
+            path: the file path
+        Returns:
+            A StopTable object
+        Raises:
+            ValueError: if the file is not a stop table
+        """
+        with open(path, "rb") as f:
+            magic, n_stops, n_lines = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a stop table file")
+            strings = [_read_strings(f, n) for n in (n_stops,) * 6 + (n_lines,)]
+            lat = _read_array(f, "d")
+            lon = _read_array(f, "d")
+            line_offsets = _read_array(f, "I")
+            line_stops = _read_array(f, "I")
+
+        return StopTable(
+            stop_id=strings[0],
+            name=strings[1],
+            city=strings[2],
+            zip_code=strings[3],
+            exchange_area_id=strings[4],
+            exchange_area_name=strings[5],
+            lat=lat,
+            lon=lon,
+            line_ids=strings[6],
+            line_offsets=line_offsets,
+            line_stops=line_stops,
+        )
+
+
+def _to_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _write_strings(f, values: list):
+    # the encoded length of every value, -1 for None
+    lengths = array("i")
+    encoded = []
+    for i in values:
+        if i is None:
+            lengths.append(-1)
+        else:
+            encoded.append(i.encode("utf-8"))
+            lengths.append(len(encoded[-1]))
+    data = b"".join(encoded)
+    _write_array(f, lengths)
+    f.write(_LENGTH.pack(len(data)))
+    f.write(data)
+
+
+def _read_strings(f, count: int) -> list[Optional[str]]:
+    lengths = _read_array(f, "i")
+    (length,) = _LENGTH.unpack(f.read(_LENGTH.size))
+    data = f.read(length)
+    if len(lengths) != count:
+        raise ValueError("corrupted stop table file")
+    ret = []
+    pos = 0
+    for n in lengths:
+        if n < 0:
+            ret.append(None)
+        else:
+            ret.append(data[pos : pos + n].decode("utf-8"))
+            pos += n
+    return ret
+
+
+def _write_array(f, values: array):
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    f.write(_LENGTH.pack(len(values)))
+    f.write(values.tobytes())
+
+
+def _read_array(f, typecode: str) -> array:
+    (length,) = _LENGTH.unpack(f.read(_LENGTH.size))
+    values = array(typecode)
+    values.frombytes(f.read(length * values.itemsize))
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
@@ -1,5 +1,10 @@
 import aiohttp
 import logging
+import time
+
+from idfm_api.columnar import StopTable
+from idfm_api.graph import StopGraph
+from idfm_api.metrics import NO_HOOKS, MetricsHook
 
 LINES = "https://data.iledefrance-mobilites.fr/explore/dataset/referentiel-des-lignes/download/?format=json&timezone=Europe/Berlin&lang=fr"
 STOP_AND_LINES = "https://data.iledefrance-mobilites.fr/explore/dataset/arrets-lignes/download/?format=json&timezone=Europe/Berlin&lang=fr"
@@ -26,45 +31,109 @@ class Dataset:
     """
 
     lines = None
+    line_index = None
     stops = None
+    stop_table = None
+    graph = None
 
     @staticmethod
-    async def get_lines(session: aiohttp.ClientSession) -> dict[str, list[dict]]:
+    async def get_lines(
+        session: aiohttp.ClientSession, hooks: MetricsHook = NO_HOOKS
+    ) -> dict[str, list[dict]]:
         """
         Fetch the latest data from IDFM (if needed) and returns the available lines
 
         Args:
             session: aiohttp session
+            hooks: the instrumentation callbacks
         Returns:
             dict[str,list[dict]]: a map of the TransportType to a list of lines (Name:ID)
         """
         if Dataset.lines is None:
-            await Dataset.fetch_data(session)
+            await Dataset.fetch_data(session, hooks)
         return Dataset.lines
 
     @staticmethod
-    async def get_stops(session: aiohttp.ClientSession) -> dict[str, list[dict]]:
+    async def get_line_index(
+        session: aiohttp.ClientSession, hooks: MetricsHook = NO_HOOKS
+    ) -> dict[str, tuple[str, str]]:
+        """
+        Fetch the latest data from IDFM (if needed) and returns the available lines by id
+
+        Args:
+            session: aiohttp session
+            hooks: the instrumentation callbacks
+        Returns:
+            dict[str, tuple[str, str]]: a map of the line id to its name and transport mode
+        """
+        if Dataset.line_index is None:
+            await Dataset.fetch_data(session, hooks)
+        return Dataset.line_index
+
+    @staticmethod
+    async def get_stops(
+        session: aiohttp.ClientSession, hooks: MetricsHook = NO_HOOKS
+    ) -> dict[str, list[dict]]:
         """
         Fetch the latest data from IDFM (if needed) and returns the available stops
 
         Args:
             session: aiohttp session
+            hooks: the instrumentation callbacks
         Returns:
             dict[str, list[dict]]: a map of the line id to a list of stops
         """
         if Dataset.stops is None:
-            await Dataset.fetch_data(session)
+            await Dataset.fetch_data(session, hooks)
         return Dataset.stops
 
     @staticmethod
-    async def fetch_data(session: aiohttp.ClientSession):
+    async def get_stop_table(
+        session: aiohttp.ClientSession, hooks: MetricsHook = NO_HOOKS
+    ) -> StopTable:
+        """
+        Fetch the latest data from IDFM (if needed) and returns the stops in a columnar layout
+
+        Args:
+            session: aiohttp session
+            hooks: the instrumentation callbacks
+        Returns:
+            StopTable: the stops as parallel arrays with the line to stops offsets
+        """
+        if Dataset.stop_table is None:
+            await Dataset.fetch_data(session, hooks)
+        return Dataset.stop_table
+
+    @staticmethod
+    async def get_graph(
+        session: aiohttp.ClientSession, hooks: MetricsHook = NO_HOOKS
+    ) -> StopGraph:
+        """
+        Fetch the latest data from IDFM (if needed) and returns the stops graph index
+
+        Args:
+            session: aiohttp session
+            hooks: the instrumentation callbacks
+        Returns:
+            StopGraph: the stops connected through their lines and exchange areas
+        """
+        if Dataset.graph is None:
+            await Dataset.fetch_data(session, hooks)
+        return Dataset.graph
+
+    @staticmethod
+    async def fetch_data(
+        session: aiohttp.ClientSession, hooks: MetricsHook = NO_HOOKS
+    ):
         """
         Fetch and process the data from IDFM datasets
 
         Args:
             session: the aiohttp session
+            hooks: the instrumentation callbacks, the duration of each stage is reported
         """
         _LOGGER.debug("fetching idfm datasets")
+        start = time.perf_counter()
         lines = {}
         line_ids = []
         for l in await (await session.get(LINES)).json():
@@ -79,6 +148,8 @@ class Dataset:
             lines[mode][name] = l["fields"]["id_line"]
             line_ids.append(l["fields"]["id_line"])
 
+        start = Dataset.__stage(hooks, "lines", start)
+
         arid_to_zdaid = {}
         zdaid_to_zdcid = {}
         for i in await (await session.get(STOP_RELATIONS)).json():
@@ -91,10 +162,14 @@ class Dataset:
             except KeyError:
                 pass
 
+        start = Dataset.__stage(hooks, "relations", start)
+
         zdc = {}
         for i in await (await session.get(EXCHANGE_AREAS)).json():
             zdc[i["zdcid"]] = i
 
+        start = Dataset.__stage(hooks, "exchange_areas", start)
+
         # map line to stops
         line_to_stops = {}
         stop_ids = {}
@@ -138,12 +213,26 @@ class Dataset:
 
         # remove lines with no associated stops
         filtered_lines = {}
+        line_index = {}
         for mode, data in lines.items():
             for name, value in data.items():
                 if value in line_to_stops:
                     if mode not in filtered_lines:
                         filtered_lines[mode] = {}
                     filtered_lines[mode][name] = value
+                    line_index[value] = (name, mode)
+
+        start = Dataset.__stage(hooks, "stops", start)
 
         Dataset.lines = filtered_lines
+        Dataset.line_index = line_index
         Dataset.stops = line_to_stops
+        Dataset.stop_table = StopTable.from_stops(line_to_stops)
+        Dataset.graph = StopGraph(Dataset.stop_table)
+        Dataset.__stage(hooks, "index", start)
+
+    @staticmethod
+    def __stage(hooks: MetricsHook, name: str, start: float) -> float:
+        now = time.perf_counter()
+        hooks.on_dataset_stage(name, now - start)
+        return now
@@ -0,0 +1,265 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from typing import Optional
+
+from aiohttp import web
+
+from idfm_api import IDFMApi
+from idfm_api.models import StopSnapshot, TrafficData
+from idfm_api.utils import normalize_stop_id
+
+POLL_INTERVAL = 30
+IDLE_TIMEOUT = 300
+STALE_POLLS = 3
+_LOGGER: logging.Logger = logging.getLogger(__package__)
+
+
+class _Entry:
+    """
+    A monitored (stop, line) couple, shared by all the clients requesting it
+    """
+
+    def __init__(self) -> None:
+        self.snapshot: Optional[StopSnapshot] = None
+        self.updated = 0.0
+        self.attempted = 0.0
+        self.last_access = time.monotonic()
+        self.pending: Optional[asyncio.Task] = None
+        self.error: Optional[str] = None
+        self.responses: dict[tuple, tuple[bytes, str]] = {}
+        self.known: dict[str, set[str]] = {}
+
+
+class Gateway:
+    """
+    HTTP server sharing one IDFMApi between many local clients
+
+    Every distinct (stop, line) couple requested by a client is polled once per poll_interval while it keeps being
+    requested, the clients are served from the last snapshot. Concurrent requests for a couple which is not known
+    yet wait for the same upstream request, so the upstream cost depends on the number of distinct stops only.
+
+    Endpoints (the stop_id parameter is required, line_id is optional):
+        GET /traffic?stop_id=...&line_id=...&destination_name=...&direction_name=...
+        GET /directions?stop_id=...&line_id=...
+        GET /destinations?stop_id=...&line_id=...&direction_name=...
+        GET /status
+
+    The responses are json documents with a weak ETag (it only covers the data, not fetched_at), requests with a
+    matching If-None-Match get a 304 response. When the upstream requests keep failing, the last snapshot is served
+    until it is older than max_staleness seconds, a 502 response with the error is returned after that
+    """
+
+    def __init__(
+        self,
+        api: IDFMApi,
+        poll_interval: float = POLL_INTERVAL,
+        idle_timeout: float = IDLE_TIMEOUT,
+        max_staleness: Optional[float] = None,
+    ) -> None:
+        """
+        Args:
+            api: the IDFMApi used for the upstream requests
+            poll_interval: the seconds between two upstream requests for a (stop, line) couple
+            idle_timeout: the seconds after which a couple which is no longer requested is not polled anymore
+            max_staleness: the maximum age in seconds of a served snapshot, defaults to STALE_POLLS poll intervals
+        """
+        self.api = api
+        self.poll_interval = poll_interval
+        self.idle_timeout = idle_timeout
+        self.max_staleness = (
+            STALE_POLLS * poll_interval if max_staleness is None else max_staleness
+        )
+        self.upstream_requests = 0
+        self.client_requests = 0
+        self._entries: dict[tuple[str, Optional[str]], _Entry] = {}
+        self._poller: Optional[asyncio.Task] = None
+        self._runner: Optional[web.AppRunner] = None
+
+        self.app = web.Application()
+        self.app.router.add_get("/traffic", self._traffic)
+        self.app.router.add_get("/directions", self._directions)
+        self.app.router.add_get("/destinations", self._destinations)
+        self.app.router.add_get("/status", self._status)
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8080):
+        """
+        Starts the HTTP server and the upstream poller
+        """
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        self._poller = asyncio.create_task(self._poll())
+
+    async def stop(self):
+        """
+        Stops the HTTP server and the upstream poller
+        """
+        if self._poller is not None:
+            self._poller.cancel()
+            self._poller = None
+        for entry in self._entries.values():
+            if entry.pending is not None:
+                entry.pending.cancel()
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def snapshot(self, stop_id: str, line_id: Optional[str] = None) -> _Entry:
+        """
+        Returns the entry of a (stop, line) couple, waiting for its first snapshot if needed
+        """
+        key = (normalize_stop_id(stop_id), line_id)
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = _Entry()
+        entry.last_access = time.monotonic()
+        # failing couples are retried once per poll interval at most
+        if entry.snapshot is None and (
+            entry.pending is not None
+            or entry.last_access - entry.attempted >= self.poll_interval
+        ):
+            await asyncio.shield(self._refresh(key, entry))
+        return entry
+
+    def _refresh(self, key: tuple, entry: _Entry) -> asyncio.Task:
+        if entry.pending is None:
+            entry.pending = asyncio.create_task(self._fetch(key, entry))
+        return entry.pending
+
+    async def _fetch(self, key: tuple, entry: _Entry):
+        try:
+            entry.attempted = time.monotonic()
+            self.upstream_requests += 1
+            entry.snapshot = await self.api.get_stop_snapshot(*key, max_age=0)
+            entry.updated = time.monotonic()
+            entry.error = None
+            entry.responses = {}
+            entry.known = {
+                "direction_name": set(entry.snapshot.get_directions()),
+                "destination_name": set(entry.snapshot.get_destinations()),
+            }
+        except Exception as e:
+            _LOGGER.warning("Error while polling %s - %s", key, e)
+            entry.error = str(e) or type(e).__name__
+        finally:
+            entry.pending = None
+
+    async def _poll(self):
+        while True:
+            now = time.monotonic()
+            for key, entry in list(self._entries.items()):
+                if now - entry.last_access > self.idle_timeout:
+                    if entry.pending is None:
+                        del self._entries[key]
+                elif now - entry.attempted >= self.poll_interval:
+                    self._refresh(key, entry)
+            await asyncio.sleep(min(1, self.poll_interval))
+
+    async def _traffic(self, request: web.Request) -> web.Response:
+        return await self._respond(
+            request,
+            ("destination_name", "direction_name"),
+            lambda s, q: [
+                _traffic_json(i)
+                for i in s.get_traffic(
+                    destination_name=q.get("destination_name"),
+                    direction_name=q.get("direction_name"),
+                )
+            ],
+        )
+
+    async def _directions(self, request: web.Request) -> web.Response:
+        return await self._respond(request, (), lambda s, q: sorted(s.get_directions()))
+
+    async def _destinations(self, request: web.Request) -> web.Response:
+        return await self._respond(
+            request,
+            ("direction_name",),
+            lambda s, q: sorted(
+                s.get_destinations(direction_name=q.get("direction_name"))
+            ),
+        )
+
+    async def _status(self, request: web.Request) -> web.Response:
+        return web.json_response(
+            {
+                "monitored": len(self._entries),
+                "client_requests": self.client_requests,
+                "upstream_requests": self.upstream_requests,
+            }
+        )
+
+    async def _respond(
+        self, request: web.Request, params: tuple, build
+    ) -> web.Response:
+        self.client_requests += 1
+        stop_id = request.query.get("stop_id")
+        if not stop_id:
+            return web.json_response({"error": "missing stop_id"}, status=400)
+
+        entry = await self.snapshot(stop_id, request.query.get("line_id"))
+        if entry.snapshot is None:
+            return web.json_response({"error": entry.error}, status=502)
+        if time.monotonic() - entry.updated > self.max_staleness:
+            return web.json_response({"error": entry.error or "stale data"}, status=502)
+
+        # the serialized responses are shared by all the clients until the next poll,
+        # the values missing from the snapshot all give an empty result and share the same key
+        # so the clients can not grow the cache
+        values = tuple(request.query.get(i) for i in params)
+        if any(
+            v is not None and v not in entry.known[i] for i, v in zip(params, values)
+        ):
+            values = None
+        key = (request.path, values)
+        cached = entry.responses.get(key)
+        if cached is None:
+            data = json.dumps(build(entry.snapshot, request.query))
+            body = (
+                f'{{"fetched_at": "{entry.snapshot.fetched_at.isoformat()}", '
+                f'"data": {data}}}'
+            ).encode()
+            # the ETag only depends on the data, so it stays valid across polls if nothing changed,
+            # it is weak as fetched_at changes
+            etag = 'W/"' + hashlib.sha1(data.encode()).hexdigest() + '"'
+            cached = entry.responses[key] = (body, etag)
+
+        body, etag = cached
+        max_age = max(0, int(self.poll_interval - (time.monotonic() - entry.updated)))
+        headers = {"ETag": etag, "Cache-Control": f"max-age={max_age}"}
+        if _etag_matches(etag, request.headers.get("If-None-Match")):
+            return web.Response(status=304, headers=headers)
+        return web.Response(body=body, content_type="application/json", headers=headers)
+
+
+def _etag_matches(etag: str, header: Optional[str]) -> bool:
+    # weak comparison, as required for If-None-Match
+    if not header:
+        return False
+    for i in header.split(","):
+        i = i.strip()
+        if i == "*" or i.removeprefix("W/") == etag.removeprefix("W/"):
+            return True
+    return False
+
+
+def _traffic_json(data: TrafficData) -> dict:
+    return {
+        "line_id": data.line_id,
+        "note": data.note,
+        "destination_name": data.destination_name,
+        "destination_id": data.destination_id,
+        "direction": data.direction,
+        "schedule": None if data.schedule is None else data.schedule.isoformat(),
+        "aimed_schedule": (
+            None if data.aimed_schedule is None else data.aimed_schedule.isoformat()
+        ),
+        "journey_id": data.journey_id,
+        "retarted": data.retarted,
+        "at_stop": data.at_stop,
+        "platform": data.platform,
+        "status": data.status.value,
+    }
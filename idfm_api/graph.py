@@ -0,0 +1,163 @@
+from array import array
+from typing import Optional
+
+from idfm_api.columnar import StopTable
+
+
+class StopGraph:
+    """
+    Adjacency index connecting the stops through their shared lines and exchange areas
+
+    All the relations are stored as CSR integer arrays (offsets + values) over the StopTable indexes:
+    line -> stops (shared with the StopTable), stop -> lines and exchange area -> stops
+
+    Changing line counts as a transfer, moving between stops of the same exchange area (ZdC) does not
+    """
+
+    def __init__(self, table: StopTable) -> None:
+        self.table = table
+        n_stops = len(table)
+        n_lines = len(table.line_ids)
+
+        self._stop_index = {s: i for i, s in enumerate(table.stop_id)}
+
+        # stop -> lines, inverse of the table line -> stops CSR
+        counts = array("I", bytes(4 * (n_stops + 1)))
+        for s in table.line_stops:
+            counts[s + 1] += 1
+        for i in range(n_stops):
+            counts[i + 1] += counts[i]
+        self.stop_offsets = counts
+        self.stop_lines = array("I", bytes(4 * len(table.line_stops)))
+        fill = array("I", counts)
+        for l in range(n_lines):
+            for s in table.line_stops[
+                table.line_offsets[l] : table.line_offsets[l + 1]
+            ]:
+                self.stop_lines[fill[s]] = l
+                fill[s] += 1
+
+        # exchange area -> stops
+        self.area_ids = []
+        self._area_index = {}
+        self.stop_area = array("i", [-1]) * n_stops
+        members = []
+        for i, area in enumerate(table.exchange_area_id):
+            if area is None:
+                continue
+            a = self._area_index.get(area)
+            if a is None:
+                a = len(self.area_ids)
+                self._area_index[area] = a
+                self.area_ids.append(area)
+                members.append([])
+            self.stop_area[i] = a
+            members[a].append(i)
+        self.area_offsets = array("I", [0])
+        self.area_stops = array("I")
+        for m in members:
+            self.area_stops.extend(m)
+            self.area_offsets.append(len(self.area_stops))
+
+    def index_of(self, stop_id: str) -> Optional[int]:
+        """
+        Returns the position of a stop in the StopTable columns
+
+        Args:
+            stop_id: A string indicating the id of a stop
+        Returns:
+            The stop index, None if the stop is unknown
+        """
+        return self._stop_index.get(stop_id)
+
+    def lines_of(self, stop_id: str) -> list[str]:
+        """
+        Returns the lines serving the specified stop or exchange area
+
+        Args:
+            stop_id: A string indicating the id of a stop or of an exchange area
+        Returns:
+            A list of line ids
+        """
+        return [
+            self.table.line_ids[l]
+            for l in sorted(self._lines_of(self._resolve(stop_id)))
+        ]
+
+    def reachable(self, stop_id: str, max_transfers: int = 0) -> list[str]:
+        """
+        Returns the stops reachable from the specified stop or exchange area
+
+        Args:
+            stop_id: A string indicating the id of the depart stop or exchange area
+            max_transfers: the maximum number of line changes (0 means only the lines serving the depart)
+        Returns:
+            A list of stop ids (including the depart stops), empty if the depart is unknown
+        """
+        reached = bytearray(len(self.table))
+        seen_lines = bytearray(len(self.table.line_ids))
+        frontier = self._with_area(self._resolve(stop_id))
+        for s in frontier:
+            reached[s] = 1
+
+        for _ in range(max_transfers + 1):
+            lines = [l for l in self._lines_of(frontier) if not seen_lines[l]]
+            if not lines:
+                break
+            frontier = []
+            for l in lines:
+                seen_lines[l] = 1
+                for s in self._line_stops(l):
+                    if not reached[s]:
+                        reached[s] = 1
+                        frontier.append(s)
+            for s in self._with_area(frontier):
+                if not reached[s]:
+                    reached[s] = 1
+                    frontier.append(s)
+
+        return [self.table.stop_id[i] for i, r in enumerate(reached) if r]
+
+    def lines_between(self, from_id: str, to_id: str) -> list[str]:
+        """
+        Returns the lines directly connecting two exchange areas (or stops)
+
+        Args:
+            from_id: A string indicating the id of the first exchange area or stop
+            to_id: A string indicating the id of the second exchange area or stop
+        Returns:
+            A list of line ids
+        """
+        a = self._lines_of(self._with_area(self._resolve(from_id)))
+        b = self._lines_of(self._with_area(self._resolve(to_id)))
+        return [self.table.line_ids[l] for l in sorted(a & b)]
+
+    def _resolve(self, id: str) -> list[int]:
+        a = self._area_index.get(id)
+        if a is not None:
+            return list(
+                self.area_stops[self.area_offsets[a] : self.area_offsets[a + 1]]
+            )
+        s = self._stop_index.get(id)
+        return [] if s is None else [s]
+
+    def _with_area(self, stops: list[int]) -> list[int]:
+        ret = set(stops)
+        for s in stops:
+            a = self.stop_area[s]
+            if a != -1:
+                ret.update(
+                    self.area_stops[self.area_offsets[a] : self.area_offsets[a + 1]]
+                )
+        return sorted(ret)
+
+    def _lines_of(self, stops) -> set[int]:
+        ret = set()
+        for s in stops:
+            ret.update(self.stop_lines[self.stop_offsets[s] : self.stop_offsets[s + 1]])
+        return ret
+
+    def _line_stops(self, line: int) -> array:
+        return self.table.line_stops[
+            self.table.line_offsets[line] : self.table.line_offsets[line + 1]
+        ]
@@ -0,0 +1,236 @@
+from bisect import bisect_left
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class MetricsHook:
+    """
+    Instrumentation callbacks called by IDFMApi and Dataset
+
+    Every method does nothing by default, subclasses only need to override the ones they are interested in
+    """
+
+    def on_request(self, endpoint: str, seconds: float, size: int, status: int):
+        """
+        Called when a response has been received
+
+        Args:
+            endpoint: the name of the endpoint (stop-monitoring, general-message, line_reports)
+            seconds: the time spent waiting for the response and downloading its body
+            size: the size of the response body in bytes
+            status: the HTTP status code
+        """
+
+    def on_decode(self, endpoint: str, stage: str, seconds: float, count: int):
+        """
+        Called after a processing stage of a response
+
+        Args:
+            endpoint: the name of the endpoint
+            stage: the processing stage (json, models, sort)
+            seconds: the time spent in this stage
+            count: the number of items processed
+        """
+
+    def on_error(self, endpoint: str, kind: str):
+        """
+        Called when a request fails
+
+        Args:
+            endpoint: the name of the endpoint
+            kind: the error kind (timeout, connection, http, decode, api)
+        """
+
+    def on_dataset_stage(self, stage: str, seconds: float):
+        """
+        Called after each stage of the Dataset build
+
+        Args:
+            stage: the build stage (lines, relations, exchange_areas, stops, index)
+            seconds: the time spent in this stage
+        """
+
+    def on_cache(self, cache: str, hits: int, misses: int):
+        """
+        Called after a cache has been used
+
+        Args:
+            cache: the name of the cache (snapshots, disruptions)
+            hits: the number of hits
+            misses: the number of misses
+        """
+
+
+NO_HOOKS = MetricsHook()
+
+
+class Histogram:
+    """
+    Cumulative histogram with fixed buckets
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRecorder(MetricsHook):
+    """
+    Hook aggregating the metrics in memory, they can be exported in the Prometheus text format
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self._buckets = buckets
+        self.request_seconds: dict[str, Histogram] = {}
+        self.response_bytes: dict[str, int] = {}
+        self.decode_seconds: dict[tuple[str, str], Histogram] = {}
+        self.decoded_items: dict[tuple[str, str], int] = {}
+        self.errors: dict[tuple[str, str], int] = {}
+        self.dataset_stages: dict[str, float] = {}
+        self.cache_hits: dict[str, int] = {}
+        self.cache_misses: dict[str, int] = {}
+
+    def on_request(self, endpoint: str, seconds: float, size: int, status: int):
+        self._histogram(self.request_seconds, endpoint).observe(seconds)
+        self.response_bytes[endpoint] = self.response_bytes.get(endpoint, 0) + size
+
+    def on_decode(self, endpoint: str, stage: str, seconds: float, count: int):
+        key = (endpoint, stage)
+        self._histogram(self.decode_seconds, key).observe(seconds)
+        self.decoded_items[key] = self.decoded_items.get(key, 0) + count
+
+    def on_error(self, endpoint: str, kind: str):
+        key = (endpoint, kind)
+        self.errors[key] = self.errors.get(key, 0) + 1
+
+    def on_dataset_stage(self, stage: str, seconds: float):
+        self.dataset_stages[stage] = seconds
+
+    def on_cache(self, cache: str, hits: int, misses: int):
+        self.cache_hits[cache] = self.cache_hits.get(cache, 0) + hits
+        self.cache_misses[cache] = self.cache_misses.get(cache, 0) + misses
+
+    def cache_hit_ratio(self, cache: str) -> float:
+        """
+        Returns the hit ratio of a cache (0 if it was never used)
+        """
+        hits = self.cache_hits.get(cache, 0)
+        total = hits + self.cache_misses.get(cache, 0)
+        return hits / total if total else 0.0
+
+    def to_prometheus(self) -> str:
+        """
+        Returns the metrics in the Prometheus text exposition format
+        """
+        lines = []
+        _histograms(
+            lines,
+            "idfm_request_duration_seconds",
+            "Time spent waiting for and downloading the responses",
+            ("endpoint",),
+            {(k,): v for k, v in self.request_seconds.items()},
+        )
+        _samples(
+            lines,
+            "idfm_response_bytes_total",
+            "counter",
+            "Size of the response bodies",
+            ("endpoint",),
+            {(k,): v for k, v in self.response_bytes.items()},
+        )
+        _histograms(
+            lines,
+            "idfm_decode_duration_seconds",
+            "Time spent processing the responses",
+            ("endpoint", "stage"),
+            self.decode_seconds,
+        )
+        _samples(
+            lines,
+            "idfm_decoded_items_total",
+            "counter",
+            "Number of items processed",
+            ("endpoint", "stage"),
+            self.decoded_items,
+        )
+        _samples(
+            lines,
+            "idfm_errors_total",
+            "counter",
+            "Number of failed requests",
+            ("endpoint", "kind"),
+            self.errors,
+        )
+        _samples(
+            lines,
+            "idfm_dataset_stage_seconds",
+            "gauge",
+            "Duration of the last Dataset build stages",
+            ("stage",),
+            {(k,): v for k, v in self.dataset_stages.items()},
+        )
+        _samples(
+            lines,
+            "idfm_cache_hits_total",
+            "counter",
+            "Number of cache hits",
+            ("cache",),
+            {(k,): v for k, v in self.cache_hits.items()},
+        )
+        _samples(
+            lines,
+            "idfm_cache_misses_total",
+            "counter",
+            "Number of cache misses",
+            ("cache",),
+            {(k,): v for k, v in self.cache_misses.items()},
+        )
+        return "\n".join(lines) + "\n"
+
+    def _histogram(self, histograms: dict, key) -> Histogram:
+        h = histograms.get(key)
+        if h is None:
+            h = histograms[key] = Histogram(self._buckets)
+        return h
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    labels = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        labels.append(extra)
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+def _samples(lines: list, name: str, type: str, help: str, names: tuple, values: dict):
+    if not values:
+        return
+    lines.append(f"# HELP {name} {help}")
+    lines.append(f"# TYPE {name} {type}")
+    for key, value in sorted(values.items()):
+        lines.append(f"{name}{_labels(names, key)} {value}")
+
+
+def _histograms(lines: list, name: str, help: str, names: tuple, histograms: dict):
+    if not histograms:
+        return
+    lines.append(f"# HELP {name} {help}")
+    lines.append(f"# TYPE {name} histogram")
+    for key, h in sorted(histograms.items()):
+        total = 0
+        for bound, count in zip(h.buckets + ("+Inf",), h.counts):
+            total += count
+            le = f'le="{bound}"'
+            lines.append(f"{name}_bucket{_labels(names, key, le)} {total}")
+        lines.append(f"{name}_sum{_labels(names, key)} {h.sum}")
+        lines.append(f"{name}_count{_labels(names, key)} {h.count}")
@@ -1,10 +1,17 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field, replace
 from datetime import datetime, timezone
 from enum import Enum, unique
 from functools import total_ordering
+from typing import Optional
 from zoneinfo import ZoneInfo
 
-from idfm_api.utils import strip_html
+from idfm_api.utils import LRUCache, parse_siri_time, strip_html
+
+DISRUPTION_CACHE_SIZE = 512
+
+# parsed disruptions, keyed by their id and version (the same disruption is usually returned unchanged for days)
+_INFO_CACHE = LRUCache(DISRUPTION_CACHE_SIZE)
+_REPORT_CACHE = LRUCache(DISRUPTION_CACHE_SIZE)
 
 
 @unique
@@ -75,6 +82,19 @@ class StopData:
             exchange_area_name=data.get("exchange_area_name"),
         )
 
+    @staticmethod
+    def from_table(table, index: int):
+        return StopData(
+            name=table.name[index],
+            stop_id=table.stop_id[index],
+            x=table.lat[index],
+            y=table.lon[index],
+            zip_code=table.zip_code[index],
+            city=table.city[index],
+            exchange_area_id=table.exchange_area_id[index],
+            exchange_area_name=table.exchange_area_name[index],
+        )
+
 
 @dataclass(frozen=True)
 class InfoData:
@@ -92,6 +112,22 @@ class InfoData:
 
     @staticmethod
     def from_json(data: dict):
+        try:
+            id = data["InfoMessageIdentifier"]["value"]
+        except (KeyError, TypeError):
+            id = data.get("id")
+        key = None
+        if id is not None:
+            key = (
+                id,
+                data.get("InfoMessageVersion"),
+                data.get("RecordedAtTime"),
+                data.get("ValidUntilTime"),
+            )
+            cached = _INFO_CACHE.get(key)
+            if cached is not None:
+                return cached
+
         name = ""
         message = ""
         if "Message" in data["Content"]:
@@ -102,7 +138,7 @@ class InfoData:
                     if i["MessageType"] == "SHORT_MESSAGE":
                         name = i["MessageText"]["value"]
 
-        return InfoData(
+        ret = InfoData(
             name=name,
             id=data.get("id"),
             message=message,
@@ -115,6 +151,9 @@ class InfoData:
             type=data["InfoChannelRef"]["value"],
             severity=data.get("InfoMessageVersion"),
         )
+        if key is not None:
+            _INFO_CACHE.put(key, ret)
+        return ret
 
 
 @dataclass(frozen=True)
@@ -135,6 +174,13 @@ class ReportData:
 
     @staticmethod
     def from_json(data: dict):
+        key = None
+        if data.get("id") is not None and data.get("updated_at") is not None:
+            key = (data["id"], data["updated_at"])
+            cached = _REPORT_CACHE.get(key)
+            if cached is not None:
+                return replace(cached, periods=list(cached.periods))
+
         name = ""
         message = ""
         if "messages" in data:
@@ -157,17 +203,21 @@ class ReportData:
                 )
             )
 
-        return ReportData(
+        ret = ReportData(
             name=name,
             id=data.get("id"),
             message=message,
-            periods=periods,
+            periods=tuple(periods),
             category=data.get("category"),
             cause=data.get("cause"),
             severity=data["severity"]["priority"],
             effect=data["severity"]["effect"],
             type=data["severity"]["name"],
         )
+        if key is not None:
+            # the cached object is never returned, so callers can not mutate its periods
+            _REPORT_CACHE.put(key, ret)
+        return replace(ret, periods=periods)
 
 
 @dataclass(frozen=True)
@@ -187,6 +237,8 @@ class TrafficData:
     at_stop: bool
     platform: str
     status: str
+    aimed_schedule: Optional[datetime] = None
+    journey_id: Optional[str] = None
 
     @staticmethod
     def from_json(data: dict):
@@ -201,23 +253,31 @@ class TrafficData:
             note = ""
 
         sch = None
+        aimed = None
         if "ExpectedArrivalTime" in data["MonitoredVehicleJourney"]["MonitoredCall"]:
-            sch = datetime.strptime(
-                data["MonitoredVehicleJourney"]["MonitoredCall"]["ExpectedArrivalTime"],
-                "%Y-%m-%dT%H:%M:%S.%fZ",
-            ).replace(tzinfo=timezone.utc)
+            sch = parse_siri_time(
+                data["MonitoredVehicleJourney"]["MonitoredCall"]["ExpectedArrivalTime"]
+            )
+            aimed = data["MonitoredVehicleJourney"]["MonitoredCall"].get(
+                "AimedArrivalTime"
+            )
         elif (
             "ExpectedDepartureTime" in data["MonitoredVehicleJourney"]["MonitoredCall"]
         ):
-            sch = datetime.strptime(
+            sch = parse_siri_time(
                 data["MonitoredVehicleJourney"]["MonitoredCall"][
                     "ExpectedDepartureTime"
-                ],
-                "%Y-%m-%dT%H:%M:%S.%fZ",
-            ).replace(tzinfo=timezone.utc)
+                ]
+            )
+            aimed = data["MonitoredVehicleJourney"]["MonitoredCall"].get(
+                "AimedDepartureTime"
+            )
         else:
             return None
 
+        if aimed is not None:
+            aimed = parse_siri_time(aimed)
+
         try:
             atstop = data["MonitoredVehicleJourney"]["MonitoredCall"]["VehicleAtStop"]
         except KeyError:
@@ -248,6 +308,14 @@ class TrafficData:
         else:
             status = TransportStatus.UNKNOWN
 
+        # stable across the requests, unlike the expected schedule
+        try:
+            journey = data["MonitoredVehicleJourney"]["FramedVehicleJourneyRef"][
+                "DatedVehicleJourneyRef"
+            ]
+        except KeyError:
+            journey = data.get("ItemIdentifier")
+
         return TrafficData(
             line_id=data["MonitoredVehicleJourney"]["LineRef"]["value"],
             note=note,
@@ -266,6 +334,8 @@ class TrafficData:
             at_stop=atstop,
             platform=plat,
             status=status,
+            aimed_schedule=aimed,
+            journey_id=journey or None,
         )
 
     def __eq__(self, other):
@@ -291,3 +361,175 @@ class TrafficData:
             )
         else:
             return NotImplemented
+
+
+@dataclass(frozen=True)
+class TrafficFilter:
+    """
+    Filter applied on the raw SIRI MonitoredStopVisit json, before it is decoded into a TrafficData
+
+    Every criterion is optional, a visit is kept only if it matches all the specified ones.
+    after and before must be timezone aware datetimes (the schedules are in UTC)
+    """
+
+    line_id: Optional[str] = None
+    destination_name: Optional[str] = None
+    direction_name: Optional[str] = None
+    after: Optional[datetime] = None
+    before: Optional[datetime] = None
+    statuses: Optional[frozenset[TransportStatus]] = None
+    _line_suffix: Optional[str] = field(
+        init=False, default=None, repr=False, compare=False
+    )
+
+    def __post_init__(self):
+        for name in ("after", "before"):
+            value = getattr(self, name)
+            if value is not None and value.utcoffset() is None:
+                raise ValueError(
+                    f"{name} must be a timezone aware datetime, got {value.isoformat()}"
+                )
+        if self.line_id is not None:
+            object.__setattr__(self, "_line_suffix", f":{self.line_id}:")
+
+    def matches(self, data: dict) -> bool:
+        """
+        Checks if a raw visit should be kept
+
+        Args:
+            data: a MonitoredStopVisit json object
+        Returns:
+            True if the visit matches all the criteria
+        """
+        try:
+            journey = data["MonitoredVehicleJourney"]
+
+            if self.line_id is not None:
+                line = journey["LineRef"]["value"]
+                if line != self.line_id and not line.endswith(self._line_suffix):
+                    return False
+
+            if self.destination_name is not None:
+                if journey["DestinationName"][0]["value"] != self.destination_name:
+                    return False
+
+            if self.direction_name is not None:
+                try:
+                    dir = journey["DirectionName"][0]["value"]
+                except (KeyError, IndexError):
+                    dir = journey["DestinationName"][0]["value"]
+                if dir != self.direction_name:
+                    return False
+
+            call = journey["MonitoredCall"]
+            if self.after is not None or self.before is not None:
+                sch = call.get("ExpectedArrivalTime") or call.get(
+                    "ExpectedDepartureTime"
+                )
+                if sch is None:
+                    return False
+                sch = parse_siri_time(sch)
+                if (self.after is not None and sch < self.after) or (
+                    self.before is not None and sch > self.before
+                ):
+                    return False
+
+            if self.statuses is not None:
+                status = (
+                    call.get("ArrivalStatus")
+                    or call.get("DepartureStatus")
+                    or TransportStatus.UNKNOWN.value
+                )
+                if status not in self.statuses:
+                    return False
+        except (KeyError, IndexError):
+            return False
+        return True
+
+
+@dataclass(frozen=True)
+class StopSnapshot:
+    """
+    Represents the state of a stop area at a given time: the next schedules and the available directions/destinations per line
+    """
+
+    stop_id: str
+    line_id: Optional[str]
+    fetched_at: datetime
+    traffic: list[TrafficData]
+    directions: dict[str, frozenset[str]]
+    destinations: dict[str, dict[str, frozenset[str]]]
+
+    @staticmethod
+    def from_traffic(
+        stop_id: str,
+        line_id: Optional[str],
+        traffic: list[TrafficData],
+        fetched_at: datetime,
+    ):
+        directions = {}
+        destinations = {}
+        for i in traffic:
+            directions.setdefault(i.line_id, set()).add(i.direction)
+            destinations.setdefault(i.line_id, {}).setdefault(i.direction, set()).add(
+                i.destination_name
+            )
+
+        return StopSnapshot(
+            stop_id=stop_id,
+            line_id=line_id,
+            fetched_at=fetched_at,
+            traffic=sorted(traffic),
+            directions={k: frozenset(v) for k, v in directions.items()},
+            destinations={
+                k: {d: frozenset(n) for d, n in v.items()}
+                for k, v in destinations.items()
+            },
+        )
+
+    def get_traffic(
+        self,
+        destination_name: Optional[str] = None,
+        direction_name: Optional[str] = None,
+        line_id: Optional[str] = None,
+    ) -> list[TrafficData]:
+        """
+        Returns the schedules of the snapshot, with the same filters as IDFMApi.get_traffic
+        """
+        lines = self._lines(line_id)
+        return [
+            i
+            for i in self.traffic
+            if i.line_id in lines
+            and (direction_name is None or i.direction == direction_name)
+            and (destination_name is None or i.destination_name == destination_name)
+        ]
+
+    def get_directions(self, line_id: Optional[str] = None) -> list[str]:
+        """
+        Returns the available directions, for all the lines if line_id is not specified
+        """
+        ret = set()
+        for i in self._lines(line_id):
+            ret.update(self.directions[i])
+        return list(ret)
+
+    def get_destinations(
+        self, direction_name: Optional[str] = None, line_id: Optional[str] = None
+    ) -> list[str]:
+        """
+        Returns the available destinations, for all the lines/directions if they are not specified
+        """
+        ret = set()
+        for i in self._lines(line_id):
+            for dir, names in self.destinations[i].items():
+                if direction_name is None or dir == direction_name:
+                    ret.update(names)
+        return list(ret)
+
+    def _lines(self, line_id: Optional[str]) -> list[str]:
+        if line_id is None:
+            return list(self.directions)
+        return [
+            i for i in self.directions if i == line_id or i.endswith(f":{line_id}:")
+        ]
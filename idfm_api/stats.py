@@ -0,0 +1,273 @@
+import math
+import time
+from array import array
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+from idfm_api.models import TrafficData, TransportStatus
+
+BUCKET_SECONDS = 30
+MIN_DELAY = -300
+MAX_DELAY = 1800
+
+
+class DelaySketch:
+    """
+    Constant memory delay distribution: a fixed width histogram, the delays outside [MIN_DELAY, MAX_DELAY] are clamped
+
+    The quantiles are estimated with a maximum error of half a bucket (15 seconds by default)
+    """
+
+    __slots__ = ("bucket", "low", "counts", "count", "sum")
+
+    def __init__(
+        self,
+        bucket: int = BUCKET_SECONDS,
+        low: int = MIN_DELAY,
+        high: int = MAX_DELAY,
+    ):
+        self.bucket = bucket
+        self.low = low
+        self.counts = array("I", bytes(4 * ((high - low) // bucket + 1)))
+        self.count = 0
+        self.sum = 0.0
+
+    def add(self, delay: float):
+        """
+        Adds a delay (in seconds) to the distribution
+        """
+        i = int((delay - self.low) // self.bucket)
+        self.counts[min(max(i, 0), len(self.counts) - 1)] += 1
+        self.count += 1
+        self.sum += delay
+
+    def merge(self, other: "DelaySketch"):
+        """
+        Adds the content of another sketch with the same buckets
+        """
+        for i, c in enumerate(other.counts):
+            self.counts[i] += c
+        self.count += other.count
+        self.sum += other.sum
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Returns the estimated delay quantile in seconds, None if the sketch is empty
+        """
+        if self.count == 0:
+            return None
+        # nearest rank
+        rank = max(1, math.ceil(q * self.count))
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return self.low + (i + 0.5) * self.bucket
+        return self.low + (len(self.counts) - 0.5) * self.bucket
+
+
+@dataclass(frozen=True)
+class DelaySummary:
+    """
+    Represents the delay statistics of a line or a stop over the aggregation window
+    """
+
+    observed: int
+    delayed: int
+    cancelled: int
+    mean_delay: Optional[float]
+    p50_delay: Optional[float]
+    p90_delay: Optional[float]
+    p99_delay: Optional[float]
+
+
+class _Slot:
+    __slots__ = ("epoch", "observed", "delayed", "cancelled", "sketch")
+
+    def __init__(self, epoch: int):
+        self.epoch = epoch
+        self.observed = 0
+        self.delayed = 0
+        self.cancelled = 0
+        self.sketch = DelaySketch()
+
+
+class WindowedDelayStats:
+    """
+    Rolling delay statistics over the last slots * slot_seconds seconds
+
+    The window is split in a fixed number of slots (each one holding counters and a DelaySketch),
+    the oldest slot is reused when the window moves
+    """
+
+    def __init__(self, slots: int = 12, slot_seconds: float = 300):
+        self.slot_seconds = slot_seconds
+        self._slots: list[Optional[_Slot]] = [None] * slots
+
+    def add(self, now: float, delay: Optional[float], delayed: bool, cancelled: bool):
+        """
+        Records a journey
+
+        Args:
+            now: the observation timestamp (seconds)
+            delay: the delay in seconds, None if unknown
+            delayed: if the journey was late
+            cancelled: if the journey was cancelled
+        """
+        epoch = int(now // self.slot_seconds)
+        i = epoch % len(self._slots)
+        slot = self._slots[i]
+        if slot is None or slot.epoch != epoch:
+            slot = self._slots[i] = _Slot(epoch)
+        slot.observed += 1
+        slot.delayed += delayed
+        slot.cancelled += cancelled
+        if delay is not None:
+            slot.sketch.add(delay)
+
+    def summary(self, now: float) -> DelaySummary:
+        """
+        Returns the statistics of the current window
+        """
+        epoch = int(now // self.slot_seconds)
+        sketch = DelaySketch()
+        observed = delayed = cancelled = 0
+        for slot in self._slots:
+            if slot is not None and epoch - len(self._slots) < slot.epoch <= epoch:
+                observed += slot.observed
+                delayed += slot.delayed
+                cancelled += slot.cancelled
+                sketch.merge(slot.sketch)
+        return DelaySummary(
+            observed=observed,
+            delayed=delayed,
+            cancelled=cancelled,
+            mean_delay=sketch.sum / sketch.count if sketch.count else None,
+            p50_delay=sketch.quantile(0.5),
+            p90_delay=sketch.quantile(0.9),
+            p99_delay=sketch.quantile(0.99),
+        )
+
+
+class DelayAggregator:
+    """
+    Keeps rolling delay and cancellation statistics per line and per stop from the get_traffic results
+
+    A journey is recorded once, with its last known state, when it is no longer returned for its stop
+    (it has left or the stop is flushed). The journeys are identified by their journey_id (or their aimed_schedule),
+    the ones without any of them are ignored. Only the journeys currently displayed are kept in memory,
+    the history is summarized in constant size sketches.
+
+    Usage:
+        aggregator = DelayAggregator()
+        while True:
+            aggregator.observe(stop_id, await idfm.get_traffic(stop_id))
+            print(aggregator.line_stats(line_id).p90_delay)
+    """
+
+    def __init__(
+        self, slots: int = 12, slot_seconds: float = 300, delay_threshold: float = 60
+    ):
+        """
+        Args:
+            slots: the number of slots of the rolling window
+            slot_seconds: the duration of a slot (the window is slots * slot_seconds seconds long)
+            delay_threshold: the delay (in seconds) from which a journey is counted as delayed
+        """
+        self.slots = slots
+        self.slot_seconds = slot_seconds
+        self.delay_threshold = delay_threshold
+        self._lines: dict[str, WindowedDelayStats] = {}
+        self._stops: dict[str, WindowedDelayStats] = {}
+        self._pending: dict[str, dict[tuple, TrafficData]] = {}
+
+    def observe(
+        self, stop_id: str, traffic: Iterable[TrafficData], now: Optional[float] = None
+    ):
+        """
+        Updates the statistics with the latest schedules of a stop
+
+        The schedules must always be requested with the same filters for a given stop_id,
+        the journeys missing from the previous call are considered as gone and recorded
+
+        Args:
+            stop_id: A string indicating the id of the stop area
+            traffic: the result of get_traffic for this stop
+            now: the observation timestamp, defaults to the current time
+        """
+        now = time.time() if now is None else now
+        current = {}
+        for i in traffic:
+            key = _journey(i)
+            if key is not None:
+                current[key] = i
+        for key, data in self._pending.get(stop_id, {}).items():
+            if key not in current:
+                self._record(stop_id, data, now)
+        self._pending[stop_id] = current
+
+    def flush(self, stop_id: Optional[str] = None, now: Optional[float] = None):
+        """
+        Records the journeys still displayed for a stop (all the stops if not specified)
+        """
+        now = time.time() if now is None else now
+        for stop in [stop_id] if stop_id is not None else list(self._pending):
+            for data in self._pending.pop(stop, {}).values():
+                self._record(stop, data, now)
+
+    def line_stats(self, line_id: str, now: Optional[float] = None) -> DelaySummary:
+        """
+        Returns the statistics of a line (line_id as returned in TrafficData.line_id)
+        """
+        return self.__summary(self._lines, line_id, now)
+
+    def stop_stats(self, stop_id: str, now: Optional[float] = None) -> DelaySummary:
+        """
+        Returns the statistics of a stop
+        """
+        return self.__summary(self._stops, stop_id, now)
+
+    def lines(self) -> list[str]:
+        """
+        Returns the lines with recorded journeys
+        """
+        return list(self._lines)
+
+    def stops(self) -> list[str]:
+        """
+        Returns the stops with recorded journeys
+        """
+        return list(self._stops)
+
+    def _record(self, stop_id: str, data: TrafficData, now: float):
+        delay = None
+        if data.aimed_schedule is not None and data.schedule is not None:
+            delay = (data.schedule - data.aimed_schedule).total_seconds()
+        cancelled = data.status == TransportStatus.CANCELLED
+        delayed = not cancelled and (
+            data.status == TransportStatus.DELAYED
+            or (delay is not None and delay >= self.delay_threshold)
+        )
+        if cancelled:
+            delay = None
+
+        for stats, key in ((self._lines, data.line_id), (self._stops, stop_id)):
+            window = stats.get(key)
+            if window is None:
+                window = stats[key] = WindowedDelayStats(self.slots, self.slot_seconds)
+            window.add(now, delay, delayed, cancelled)
+
+    def __summary(self, stats: dict, key: str, now: Optional[float]) -> DelaySummary:
+        window = stats.get(key)
+        if window is None:
+            window = WindowedDelayStats(self.slots, self.slot_seconds)
+        return window.summary(time.time() if now is None else now)
+
+
+def _journey(data: TrafficData) -> Optional[tuple]:
+    # the expected schedule changes between two requests, it can not identify a journey
+    if data.journey_id is not None:
+        return (data.line_id, data.journey_id)
+    if data.aimed_schedule is not None:
+        return (data.line_id, data.destination_id, data.aimed_schedule)
+    return None
@@ -0,0 +1,133 @@
+from dataclasses import dataclass
+from typing import Optional
+
+import aiohttp
+
+try:
+    import brotli  # noqa: F401
+
+    HAS_BROTLI = True
+except ImportError:
+    try:
+        import brotlicffi  # noqa: F401
+
+        HAS_BROTLI = True
+    except ImportError:
+        HAS_BROTLI = False
+
+
+def accept_encoding() -> str:
+    """
+    Returns the Accept-Encoding header value supported by aiohttp (brotli requires an optional dependency)
+    """
+    return "gzip, deflate, br" if HAS_BROTLI else "gzip, deflate"
+
+
+@dataclass(frozen=True)
+class TransportConfig:
+    """
+    Settings of the connection pool owned by IDFMApi in managed mode
+
+    All the requests (PRIM, navitia and the open data datasets) share the same pool
+    """
+
+    limit: int = 20
+    limit_per_host: int = 10
+    keepalive_timeout: float = 60
+    dns_cache_ttl: int = 300
+    compression: bool = True
+
+
+@dataclass(frozen=True)
+class PoolStats:
+    """
+    Represents the usage of the managed connection pool
+    """
+
+    limit: int
+    limit_per_host: int
+    requests: int
+    in_flight: int
+    connections_created: int
+    connections_reused: int
+    queued: int
+
+
+class ManagedTransport:
+    """
+    Owns the aiohttp session and its tuned connector, and tracks the pool usage with aiohttp request tracing
+    """
+
+    def __init__(self, config: TransportConfig) -> None:
+        self.config = config
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._requests = 0
+        self._in_flight = 0
+        self._created = 0
+        self._reused = 0
+        self._queued = 0
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """
+        The managed session, created on first use (it must be accessed from a running event loop)
+        """
+        if self._session is None or self._session.closed:
+            trace = aiohttp.TraceConfig()
+            trace.on_request_start.append(self.__on_request_start)
+            trace.on_request_end.append(self.__on_request_done)
+            trace.on_request_exception.append(self.__on_request_done)
+            trace.on_connection_create_end.append(self.__on_connection_created)
+            trace.on_connection_reuseconn.append(self.__on_connection_reused)
+            trace.on_connection_queued_start.append(self.__on_connection_queued)
+
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.config.limit,
+                    limit_per_host=self.config.limit_per_host,
+                    keepalive_timeout=self.config.keepalive_timeout,
+                    use_dns_cache=True,
+                    ttl_dns_cache=self.config.dns_cache_ttl,
+                ),
+                auto_decompress=self.config.compression,
+                trace_configs=[trace],
+            )
+        return self._session
+
+    def stats(self) -> PoolStats:
+        """
+        Returns the connection pool statistics
+        """
+        return PoolStats(
+            limit=self.config.limit,
+            limit_per_host=self.config.limit_per_host,
+            requests=self._requests,
+            in_flight=self._in_flight,
+            connections_created=self._created,
+            connections_reused=self._reused,
+            queued=self._queued,
+        )
+
+    async def close(self):
+        """
+        Closes the managed session and its connections
+        """
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __on_request_start(self, session, ctx, params):
+        self._requests += 1
+        self._in_flight += 1
+
+    async def __on_request_done(self, session, ctx, params):
+        self._in_flight -= 1
+
+    async def __on_connection_created(self, session, ctx, params):
+        self._created += 1
+
+    async def __on_connection_reused(self, session, ctx, params):
+        self._reused += 1
+
+    async def __on_connection_queued(self, session, ctx, params):
+        self._queued += 1
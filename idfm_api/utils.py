@@ -1,6 +1,12 @@
+import re
+from collections import OrderedDict
+from datetime import datetime, timezone
+from html import unescape
 from io import StringIO
 from html.parser import HTMLParser
 
+_TAG = re.compile(r"""</?[a-zA-Z](?:[^<>"']|"[^"]*"|'[^']*')*>""")
+
 # from https://stackoverflow.com/questions/753052/strip-html-from-strings-in-python
 
 
@@ -31,6 +37,101 @@ def strip_html(html):
     Returns:
         The specified string without the HTML tags
     """
+    if "<" not in html:
+        return unescape(html) if "&" in html else html
+
+    # fast path for simple markup, the parser is only needed for comments, CDATA, malformed tags...
+    text = _TAG.sub("", html)
+    if "<" not in text:
+        return unescape(text) if "&" in text else text
+
     s = MLStripper()
     s.feed(html)
     return s.get_data()
+
+
+class LRUCache:
+    """
+    Least recently used cache with a fixed maximum size
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        """
+        Returns the cached value for the specified key (and marks it as recently used)
+        Args:
+            key: the cache key
+        Returns:
+            The cached value, None if the key is not cached
+        """
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """
+        Adds a value to the cache, evicting the least recently used one if it is full
+        Args:
+            key: the cache key
+            value: the value to cache
+        """
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        """
+        Removes all the cached values
+        """
+        self._data.clear()
+
+
+def normalize_stop_id(stop_id: str) -> str:
+    """
+    Returns the full PRIM id of a stop (I.E. STIF:StopPoint:Q:41087:)
+    Args:
+        stop_id: the full id or only the stoppoint id (I.E. 41087), for backward compatibility
+    Returns:
+        The full stop id
+    """
+    if stop_id[0:4] != "STIF":
+        return f"STIF:StopPoint:Q:{stop_id.split(':')[-1]}:"
+    return stop_id
+
+
+def parse_siri_time(value: str) -> datetime:
+    """
+    Parses a SIRI timestamp (I.E. 2024-01-01T10:00:00.000Z)
+    Args:
+        value: the timestamp
+    Returns:
+        An UTC datetime
+    """
+    # fast path for the usual millisecond precision, strptime is much slower
+    if (
+        len(value) == 24
+        and value[4] == value[7] == "-"
+        and value[10] == "T"
+        and value[13] == value[16] == ":"
+        and value[19] == "."
+        and value[23] == "Z"
+    ):
+        # fromisoformat rejects the non digit fields
+        return datetime.fromisoformat(value[:23] + "+00:00")
+    return datetime.strptime(value, "%Y-%m-%dT%H:%M:%S.%fZ").replace(
+        tzinfo=timezone.utc
+    )
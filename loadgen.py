@@ -0,0 +1,101 @@
+"""
+Load generator for IDFMApi
+
+Calls get_traffic at a target request rate over a set of stops and reports the latency percentiles and the throughput.
+By default a local PRIM stand-in (see benchmarks/server.py) is started, use --url and --apikey to target another server.
+
+    python loadgen.py --rate 50 --duration 30 --stops 200 --latency 0.08 --error-rate 0.01
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+
+from benchmarks import fixtures
+from benchmarks.server import StandInServer, add_arguments
+from idfm_api import IDFMApi
+from idfm_api.transport import TransportConfig
+
+
+async def run(args):
+    server = None
+    url = args.url
+    if url is None:
+        server = StandInServer(
+            fixtures.load(args.fixtures, lines=args.lines, visits=args.visits),
+            latency=args.latency,
+            jitter=args.jitter,
+            error_rate=args.error_rate,
+            quota=args.quota,
+            quota_window=args.quota_window,
+        )
+        await server.start()
+        url = server.prim_url
+
+    stops = [f"STIF:StopPoint:Q:{400000 + i}:" for i in range(args.stops)]
+    latencies = []
+    errors = 0
+
+    async def call(api, stop_id):
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            await api.get_traffic(stop_id)
+        except Exception:
+            errors += 1
+        else:
+            latencies.append(time.perf_counter() - start)
+
+    total = int(args.rate * args.duration)
+    transport = TransportConfig(limit=args.pool_size, limit_per_host=args.pool_size)
+    async with IDFMApi(
+        None, args.apikey, timeout=args.timeout, transport=transport, base_url=url
+    ) as api:
+        tasks = []
+        begin = time.perf_counter()
+        for i in range(total):
+            delay = begin + i / args.rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(call(api, stops[i % len(stops)])))
+        sent = time.perf_counter() - begin
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - begin
+        stats = api.pool_stats()
+
+    if server is not None:
+        await server.stop()
+
+    latencies.sort()
+    print(f"requests      {total} sent in {sent:.1f}s ({total / sent:.1f}/s)")
+    print(f"completed     {len(latencies)} ok, {errors} errors")
+    print(f"throughput    {len(latencies) / elapsed:.1f} req/s")
+    if latencies:
+        for q in (0.5, 0.9, 0.99):
+            value = latencies[min(len(latencies) - 1, int(len(latencies) * q))]
+            print(f"p{int(q * 100):<12} {value * 1000:.1f} ms")
+    print(
+        f"pool          {stats.connections_created} connections created, "
+        f"{stats.connections_reused} reused, {stats.queued} queued"
+    )
+    if server is not None:
+        print(
+            f"stand-in      {server.errors} errors, {server.rejected} quota rejections"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="IDFMApi load generator")
+    parser.add_argument("--url", help="PRIM url (a local stand-in is used if omitted)")
+    parser.add_argument("--apikey", default="loadgen")
+    parser.add_argument("--rate", type=float, default=20, help="requests per second")
+    parser.add_argument("--duration", type=float, default=10, help="seconds")
+    parser.add_argument("--stops", type=int, default=100, help="distinct stops")
+    parser.add_argument("--pool-size", type=int, default=20)
+    parser.add_argument("--timeout", type=int, default=10, help="request timeout")
+    parser.add_argument("--verbose", action="store_true", help="show idfm_api logs")
+    add_arguments(parser)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.CRITICAL)
+    asyncio.run(run(args))
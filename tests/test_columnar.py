@@ -0,0 +1,93 @@
+import math
+
+import pytest
+
+from idfm_api.columnar import StopTable
+
+
+def table():
+    return StopTable.from_stops(
+        {
+            "L1": [
+                {
+                    "stop_id": "S1",
+                    "name": "Châtelet – Les Halles",
+                    "city": None,
+                    "zipCode": None,
+                    "exchange_area_id": "Z1",
+                    "exchange_area_name": "Zone de correspondance",
+                    "x": "48.86",
+                    "y": "2.34",
+                },
+                {
+                    "stop_id": "S2",
+                    "name": "",
+                    "city": "Saint-Denis\0Nord",
+                    "zipCode": "93066",
+                    "exchange_area_id": None,
+                    "exchange_area_name": None,
+                    "x": None,
+                    "y": "2.35",
+                },
+            ],
+            "L2": [],
+            "L3": [
+                {
+                    "stop_id": "S1",
+                    "name": "Châtelet – Les Halles",
+                    "city": None,
+                    "zipCode": None,
+                    "exchange_area_id": "Z1",
+                    "exchange_area_name": "Zone de correspondance",
+                    "x": "48.86",
+                    "y": "2.34",
+                }
+            ],
+        }
+    )
+
+
+def test_round_trip(tmp_path):
+    t = table()
+    path = str(tmp_path / "stops.bin")
+    t.dump(path)
+    loaded = StopTable.load(path)
+
+    for col in (
+        "stop_id",
+        "name",
+        "city",
+        "zip_code",
+        "exchange_area_id",
+        "exchange_area_name",
+        "line_ids",
+    ):
+        assert getattr(loaded, col) == getattr(t, col)
+    assert loaded.name == ["Châtelet – Les Halles", ""]
+    assert loaded.city == [None, "Saint-Denis\0Nord"]
+    assert loaded.exchange_area_id == ["Z1", None]
+    assert list(loaded.lat[:1]) == [48.86] and math.isnan(loaded.lat[1])
+    assert loaded.lon == t.lon
+    assert loaded.line_offsets == t.line_offsets
+    assert loaded.line_stops == t.line_stops
+
+
+def test_round_trip_empty(tmp_path):
+    path = str(tmp_path / "empty.bin")
+    StopTable.from_stops({}).dump(path)
+    assert len(StopTable.load(path)) == 0
+
+
+def test_load_invalid_file(tmp_path):
+    path = tmp_path / "invalid.bin"
+    path.write_bytes(b"NOTATABLE" + bytes(16))
+    with pytest.raises(ValueError):
+        StopTable.load(str(path))
+
+
+def test_stops_of():
+    t = table()
+    assert list(t.stops_of("L1")) == [0, 1]
+    assert list(t.stops_of("L2")) == []
+    assert list(t.stops_of("L3")) == [0]
+    assert list(t.stops_of("unknown")) == []
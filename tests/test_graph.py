@@ -0,0 +1,59 @@
+from idfm_api.columnar import StopTable
+from idfm_api.graph import StopGraph
+
+
+def stop(stop_id, area=None):
+    return {
+        "stop_id": stop_id,
+        "name": stop_id,
+        "city": "Paris",
+        "zipCode": "75056",
+        "exchange_area_id": area,
+        "exchange_area_name": None if area is None else f"Area {area}",
+        "x": "48.8",
+        "y": "2.3",
+    }
+
+
+def graph():
+    # L1: A - B, L2: C - D, L3: D - E, L4: F - G
+    # B and C are in the same exchange area Z1, F-G is not connected to the rest
+    return StopGraph(
+        StopTable.from_stops(
+            {
+                "L1": [stop("A"), stop("B", "Z1")],
+                "L2": [stop("C", "Z1"), stop("D")],
+                "L3": [stop("D"), stop("E")],
+                "L4": [stop("F"), stop("G")],
+            }
+        )
+    )
+
+
+def test_reachable_without_transfer():
+    # C is reached through the exchange area of B, but not its line
+    assert sorted(graph().reachable("A", 0)) == ["A", "B", "C"]
+
+
+def test_reachable_with_transfers():
+    g = graph()
+    assert sorted(g.reachable("A", 1)) == ["A", "B", "C", "D"]
+    assert sorted(g.reachable("A", 2)) == ["A", "B", "C", "D", "E"]
+    assert sorted(g.reachable("A", 5)) == ["A", "B", "C", "D", "E"]
+
+
+def test_reachable_from_exchange_area():
+    assert sorted(graph().reachable("Z1", 0)) == ["A", "B", "C", "D"]
+
+
+def test_reachable_unknown_stop():
+    assert graph().reachable("unknown", 2) == []
+
+
+def test_lines():
+    g = graph()
+    assert g.lines_of("D") == ["L2", "L3"]
+    assert g.lines_of("Z1") == ["L1", "L2"]
+    assert g.lines_between("A", "Z1") == ["L1"]
+    assert g.lines_between("C", "E") == []
+    assert g.lines_between("D", "E") == ["L3"]
@@ -0,0 +1,48 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from idfm_api.utils import normalize_stop_id, parse_siri_time
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        "2024-01-01T10:00:00.123Z",
+        "2024-12-31T23:59:59.000Z",
+        "2024-02-29T00:00:00.999Z",
+        "2024-01-01T10:00:00.1Z",
+        "2024-01-01T10:00:00.123456Z",
+    ],
+)
+def test_parse_siri_time(value):
+    expected = datetime.strptime(value, "%Y-%m-%dT%H:%M:%S.%fZ").replace(
+        tzinfo=timezone.utc
+    )
+    assert parse_siri_time(value) == expected
+    assert parse_siri_time(value).utcoffset().total_seconds() == 0
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        "2024/01/01 10:00:00.000Z",
+        "2024-01-01T+1:00:00.123Z",
+        "2024-01-01T 1:00:00.123Z",
+        "2024-01-01T10:00:00,123Z",
+        "2024-13-01T10:00:00.123Z",
+        "2023-02-29T10:00:00.123Z",
+        "2024-01-01T10:00:00.123",
+        "",
+    ],
+)
+def test_parse_siri_time_malformed(value):
+    with pytest.raises(ValueError):
+        parse_siri_time(value)
+
+
+def test_normalize_stop_id():
+    assert normalize_stop_id("41087") == "STIF:StopPoint:Q:41087:"
+    assert normalize_stop_id("Q:41087") == "STIF:StopPoint:Q:41087:"
+    assert normalize_stop_id("STIF:StopPoint:Q:41087:") == "STIF:StopPoint:Q:41087:"
+    assert normalize_stop_id("STIF:StopArea:SP:1:") == "STIF:StopArea:SP:1:"